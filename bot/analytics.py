@@ -0,0 +1,90 @@
+import logging
+
+import numpy as np
+
+from trades import TradesStore
+from trade import MarketData
+
+logger = logging.getLogger(__name__)
+
+ACTIVE = "Активна"
+CLOSED = "Закрыта"
+
+
+class TradeArrays:
+    """Сделки в колоночном виде: по одному NumPy-массиву на поле, пустые числа — NaN."""
+
+    def __init__(self, rows: list):
+        columns = list(zip(*rows)) if rows else [()] * 8
+        ticker, status, deal_type, deal_date, entry, exit_, volume, fees = columns
+
+        self.ticker = np.array([t or "" for t in ticker], dtype=object)
+        self.status = np.array(status, dtype=object)
+        self.sign = np.where(np.array(deal_type, dtype=object) == "Short", -1.0, 1.0)
+        self.deal_date = np.array([d[:10] if d else "NaT" for d in deal_date], dtype="datetime64[D]")
+        self.entry = np.array(entry, dtype=float)
+        self.exit = np.array(exit_, dtype=float)
+        self.volume = np.nan_to_num(np.array(volume, dtype=float))
+        self.fees = np.nan_to_num(np.array(fees, dtype=float))
+
+    def __len__(self) -> int:
+        return len(self.ticker)
+
+
+def resolve_prices(tickers: np.ndarray, snapshot: dict[str, dict]) -> np.ndarray:
+    """Цены для уникальных тикеров: в Notion пишут BTC, на Bybit — BTCUSDT."""
+    prices = np.full(len(tickers), np.nan)
+    for i, ticker in enumerate(tickers):
+        info = snapshot.get(ticker.upper()) or snapshot.get(f"{ticker.upper()}USDT")
+        if info and info.get("lastPrice"):
+            prices[i] = float(info["lastPrice"])
+    return prices
+
+
+def compute_analytics(trades: TradeArrays, snapshot: dict[str, dict]) -> dict:
+    if not len(trades):
+        return {"trades": 0}
+
+    tickers, inverse = np.unique(trades.ticker.astype(str), return_inverse=True)
+    live = resolve_prices(tickers, snapshot)[inverse]
+
+    closed = (trades.status == CLOSED) & ~np.isnan(trades.entry) & ~np.isnan(trades.exit)
+    active = (trades.status == ACTIVE) & ~np.isnan(trades.entry)
+
+    realized = np.where(closed, (trades.exit - trades.entry) * trades.volume * trades.sign - trades.fees, 0.0)
+    priced = active & ~np.isnan(live)
+    unrealized = np.where(priced, (live - trades.entry) * trades.volume * trades.sign, 0.0)
+
+    # Экспозиция по живой цене, а если её нет — по цене входа
+    mark = np.where(np.isnan(live), trades.entry, live)
+    exposure = np.bincount(inverse, weights=np.where(active, mark * trades.volume * trades.sign, 0.0),
+                           minlength=len(tickers))
+
+    # Просадка по кривой реализованного PnL в порядке дат сделок
+    order = np.argsort(trades.deal_date[closed], kind="stable")
+    equity = np.cumsum(realized[closed][order])
+    drawdown = np.maximum.accumulate(np.maximum(equity, 0.0)) - equity if len(equity) else np.zeros(1)
+
+    wins = realized[closed] > 0
+    return {
+        "trades": len(trades),
+        "closed": int(closed.sum()),
+        "active": int(active.sum()),
+        "realized": float(realized.sum()),
+        "unrealized": float(unrealized.sum()),
+        "unpriced": int((active & ~priced).sum()),
+        "win_rate": float(wins.mean()) if len(wins) else 0.0,
+        "max_drawdown": float(drawdown.max()),
+        "exposure": {str(t): float(e) for t, e in zip(tickers, exposure) if e},
+    }
+
+
+async def analyze(store: TradesStore, market: MarketData) -> dict:
+    rows = await store.aall_trades()
+    try:
+        snapshot = await market.snapshot()
+    except Exception as e:
+        # Реализованный PnL, win rate и просадка считаются без цен; активные попадут в unpriced
+        logger.warning("Цены Bybit недоступны, /stats без нереализованного PnL: %s", e)
+        snapshot = {}
+    return compute_analytics(TradeArrays(rows), snapshot)
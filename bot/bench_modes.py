@@ -0,0 +1,182 @@
+"""Бенчмарк: задержка update → ответ в режимах polling и webhook против локального фейкового Telegram API.
+
+python bench_modes.py [кол-во апдейтов] [апдейтов в секунду]
+"""
+import asyncio
+import statistics
+import sys
+import time
+
+from aiohttp import ClientSession, web
+from aiogram import Bot, Dispatcher, Router
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.types import Message
+
+from server import create_webhook_app
+
+TOKEN = "42:bench"
+API_PORT = 8181
+WEBHOOK_PORT = 8182
+WEBHOOK_PATH = "/telegram-webhook"
+SECRET = "bench-secret"
+
+
+class FakeTelegram:
+    """Минимальный Bot API: getMe, getUpdates (long polling), setWebhook/deleteWebhook, sendMessage."""
+
+    def __init__(self):
+        self.updates: list[dict] = []
+        self.new_update = asyncio.Condition()
+        self.sent_at: dict[str, float] = {}
+        self.latencies: list[float] = []
+        self.done = asyncio.Event()
+        self.expected = 0
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self.handle)
+        return app
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        data = await request.post()
+
+        if method == "getMe":
+            result = {"id": 42, "is_bot": True, "first_name": "bench", "username": "bench_bot"}
+        elif method == "getUpdates":
+            result = await self.get_updates(int(data.get("offset", 0)), float(data.get("timeout", 0)))
+        elif method == "sendMessage":
+            text = data.get("text", "")
+            started = self.sent_at.pop(text, None)
+            if started is not None:
+                self.latencies.append(time.perf_counter() - started)
+                if len(self.latencies) >= self.expected:
+                    self.done.set()
+            result = {
+                "message_id": 1,
+                "date": int(time.time()),
+                "chat": {"id": int(data.get("chat_id", 1)), "type": "private"},
+                "text": text,
+            }
+        else:
+            result = True
+
+        return web.json_response({"ok": True, "result": result})
+
+    async def get_updates(self, offset: int, timeout: float) -> list[dict]:
+        async with self.new_update:
+            pending = [u for u in self.updates if u["update_id"] >= offset]
+            if not pending and timeout:
+                try:
+                    await asyncio.wait_for(self.new_update.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                pending = [u for u in self.updates if u["update_id"] >= offset]
+        return pending
+
+    async def push(self, update: dict):
+        async with self.new_update:
+            self.updates.append(update)
+            self.new_update.notify_all()
+
+
+def make_update(update_id: int) -> dict:
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": 1, "type": "private"},
+            "from": {"id": 1, "is_bot": False, "first_name": "bench"},
+            "text": f"ping {update_id}",
+        },
+    }
+
+
+def make_dispatcher() -> Dispatcher:
+    router = Router()
+
+    @router.message()
+    async def echo(message: Message):
+        await message.answer(message.text)
+
+    dp = Dispatcher()
+    dp.include_router(router)
+    return dp
+
+
+async def start_site(app: web.Application, port: int) -> web.AppRunner:
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+    return runner
+
+
+def make_bot() -> Bot:
+    session = AiohttpSession(api=TelegramAPIServer.from_base(f"http://127.0.0.1:{API_PORT}"))
+    return Bot(token=TOKEN, session=session)
+
+
+async def bench_polling(count: int, rate: float) -> list[float]:
+    fake = FakeTelegram()
+    fake.expected = count
+    api = await start_site(fake.app(), API_PORT)
+    bot = make_bot()
+    dp = make_dispatcher()
+    polling = asyncio.create_task(dp.start_polling(bot, polling_timeout=10, handle_signals=False))
+
+    for i in range(1, count + 1):
+        update = make_update(i)
+        fake.sent_at[update["message"]["text"]] = time.perf_counter()
+        await fake.push(update)
+        await asyncio.sleep(1 / rate)
+
+    await asyncio.wait_for(fake.done.wait(), 30)
+    await dp.stop_polling()
+    await polling
+    await api.cleanup()
+    return fake.latencies
+
+
+async def bench_webhook(count: int, rate: float) -> list[float]:
+    fake = FakeTelegram()
+    fake.expected = count
+    api = await start_site(fake.app(), API_PORT)
+    bot = make_bot()
+    dp = make_dispatcher()
+    hook = await start_site(create_webhook_app(dp, bot, WEBHOOK_PATH, SECRET), WEBHOOK_PORT)
+
+    url = f"http://127.0.0.1:{WEBHOOK_PORT}{WEBHOOK_PATH}"
+    headers = {"X-Telegram-Bot-Api-Secret-Token": SECRET}
+    async with ClientSession() as session:
+        for i in range(1, count + 1):
+            update = make_update(i)
+            fake.sent_at[update["message"]["text"]] = time.perf_counter()
+            async with session.post(url, json=update, headers=headers) as resp:
+                resp.raise_for_status()
+            await asyncio.sleep(1 / rate)
+
+    await asyncio.wait_for(fake.done.wait(), 30)
+    await hook.cleanup()
+    await api.cleanup()
+    return fake.latencies
+
+
+def report(mode: str, latencies: list[float]):
+    ms = sorted(x * 1000 for x in latencies)
+    p50 = statistics.median(ms)
+    p99 = ms[min(len(ms) - 1, int(len(ms) * 0.99))]
+    print(f"{mode:<8} n={len(ms):<5} p50={p50:7.2f} ms  p99={p99:7.2f} ms  max={ms[-1]:7.2f} ms")
+
+
+async def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    rate = float(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+    report("polling", await bench_polling(count, rate))
+    report("webhook", await bench_webhook(count, rate))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,65 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable
+
+
+class TTLCache:
+    """Кэш с TTL и LRU-вытеснением; одновременные промахи по ключу ждут одну загрузку."""
+
+    def __init__(self, ttl: float = 1.0, maxsize: int = 1024):
+        self.ttl = ttl
+        self.maxsize = maxsize
+
+        self._data: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self._inflight: dict[str, asyncio.Task] = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    async def get(self, key: str, loader: Callable[[], Awaitable[Any]]) -> Any:
+        item = self._data.get(key)
+        if item is not None and item[0] > time.monotonic():
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            task = asyncio.create_task(self._load(key, loader))
+            self._inflight[key] = task
+
+        # shield: отмена одного ожидающего не отменяет общую загрузку
+        return await asyncio.shield(task)
+
+    async def _load(self, key: str, loader: Callable[[], Awaitable[Any]]) -> Any:
+        try:
+            value = await loader()
+            self.put(key, value)
+            return value
+        finally:
+            self._inflight.pop(key, None)
+
+    def put(self, key: str, value: Any):
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,134 @@
+"""Проверка PriceStream против локального фейкового WS-сервера Bybit: subscribe → тикер → get() и переподключение.
+
+python check_stream.py
+"""
+import asyncio
+import sys
+
+from aiohttp import WSMsgType, web
+
+from stream import PriceStream
+
+WS_PORT = 8191
+SYMBOLS = ["BTCUSDT", "ETHUSDT"]
+
+
+class FakeBybit:
+    """Минимальный публичный поток Bybit: принимает subscribe/ping, рассылает тикеры подписчикам."""
+
+    def __init__(self):
+        self.sockets: list[web.WebSocketResponse] = []
+        self.topics: list[str] = []
+        self.connections = 0
+        self.pings = 0
+        self.accepting = True
+        self.subscribed = asyncio.Event()
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/v5/public/spot", self.handle)
+        return app
+
+    async def handle(self, request: web.Request) -> web.StreamResponse:
+        if not self.accepting:
+            # Биржа недоступна — клиент уходит в backoff
+            return web.Response(status=503)
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self.connections += 1
+        self.sockets.append(ws)
+        try:
+            async for msg in ws:
+                if msg.type != WSMsgType.TEXT:
+                    continue
+                data = msg.json()
+                if data.get("op") == "subscribe":
+                    self.topics = list(data.get("args", []))
+                    await ws.send_json({"success": True, "op": "subscribe"})
+                    self.subscribed.set()
+                elif data.get("op") == "ping":
+                    self.pings += 1
+                    await ws.send_json({"success": True, "op": "pong"})
+        finally:
+            self.sockets.remove(ws)
+        return ws
+
+    async def ticker(self, symbol: str, price: str):
+        for ws in list(self.sockets):
+            await ws.send_json({"topic": f"tickers.{symbol}", "type": "snapshot", "data": {"symbol": symbol, "lastPrice": price}})
+
+    async def drop(self):
+        # Обрыв со стороны биржи — клиент должен переподключиться и заново подписаться
+        self.subscribed.clear()
+        for ws in list(self.sockets):
+            await ws.close()
+
+
+async def wait_for(predicate, timeout: float = 5.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not predicate():
+        if asyncio.get_running_loop().time() > deadline:
+            raise TimeoutError
+        await asyncio.sleep(0.01)
+
+
+async def main() -> int:
+    fake = FakeBybit()
+    runner = web.AppRunner(fake.app())
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", WS_PORT).start()
+
+    stream = PriceStream(
+        SYMBOLS, url=f"ws://127.0.0.1:{WS_PORT}/v5/public/spot", ping_interval=0.2, reconnect_delay=0.1,
+        max_age=0.5,
+    )
+    failures = []
+
+    def check(name: str, ok: bool):
+        print(f"{'✅' if ok else '❌'} {name}")
+        if not ok:
+            failures.append(name)
+
+    try:
+        await stream.start()
+        await asyncio.wait_for(fake.subscribed.wait(), 5)
+        check("подписка на tickers.*", sorted(fake.topics) == [f"tickers.{s}" for s in sorted(SYMBOLS)])
+
+        await fake.ticker("BTCUSDT", "65000.5")
+        await fake.ticker("DOGEUSDT", "0.1")
+        await wait_for(lambda: stream.get("BTCUSDT") is not None)
+        check("get() отдаёт цену из потока", stream.get("btcusdt") == {"symbol": "BTCUSDT", "lastPrice": "65000.5"})
+        check("неподписанный символ игнорируется", stream.get("DOGEUSDT") is None)
+
+        await wait_for(lambda: fake.pings > 0)
+        check("ping уходит по интервалу", fake.pings > 0)
+
+        await asyncio.sleep(0.6)
+        check("устаревшая цена не отдаётся", stream.get("BTCUSDT") is None)
+
+        await fake.ticker("BTCUSDT", "65100")
+        await wait_for(lambda: stream.get("BTCUSDT") is not None)
+        fake.accepting = False
+        await fake.drop()
+        await wait_for(lambda: not stream.connected.is_set())
+        check("во время обрыва get() уходит в REST", stream.get("BTCUSDT") is None)
+
+        fake.accepting = True
+        await asyncio.wait_for(fake.subscribed.wait(), 5)
+        check("переподключение и повторная подписка", fake.connections == 2)
+
+        await fake.ticker("BTCUSDT", "66000")
+        await wait_for(lambda: (stream.get("BTCUSDT") or {}).get("lastPrice") == "66000")
+        check("после переподключения цены обновляются", stream.connected.is_set())
+    except TimeoutError:
+        failures.append("таймаут")
+        print("❌ таймаут ожидания")
+    finally:
+        await stream.stop()
+        await runner.cleanup()
+
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,77 @@
+import os
+
+import aiohttp
+import httpx
+from notion_client import AsyncClient
+
+
+class ClientRegistry:
+    """Общие HTTP-клиенты на всё время жизни бота (пулы keep-alive соединений)."""
+
+    def __init__(
+        self,
+        notion_token: str | None = None,
+        limit: int = 100,
+        limit_per_host: int = 20,
+        keepalive: float = 30.0,
+        timeout: float = 10.0,
+        connect_timeout: float = 3.0,
+    ):
+        self.notion_token = notion_token
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive = keepalive
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+
+        self.session: aiohttp.ClientSession | None = None
+        self.notion: AsyncClient | None = None
+
+    @classmethod
+    def from_env(cls) -> "ClientRegistry":
+        return cls(
+            notion_token=os.getenv("NOTION_TOKEN"),
+            limit=int(os.getenv("HTTP_POOL_LIMIT", 100)),
+            limit_per_host=int(os.getenv("HTTP_POOL_LIMIT_PER_HOST", 20)),
+            keepalive=float(os.getenv("HTTP_KEEPALIVE", 30)),
+            timeout=float(os.getenv("HTTP_TIMEOUT", 10)),
+            connect_timeout=float(os.getenv("HTTP_CONNECT_TIMEOUT", 3)),
+        )
+
+    async def start(self):
+        if self.session is not None:
+            return
+
+        connector = aiohttp.TCPConnector(
+            limit=self.limit,
+            limit_per_host=self.limit_per_host,
+            keepalive_timeout=self.keepalive,
+            ttl_dns_cache=300,
+        )
+        self.session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=self.timeout, connect=self.connect_timeout),
+        )
+
+        # notion_client сам выставляет base_url, заголовки и общий таймаут
+        # на переданный httpx-клиент, от нас нужны только лимиты пула
+        http = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=self.limit_per_host,
+                max_keepalive_connections=self.limit_per_host,
+                keepalive_expiry=self.keepalive,
+            ),
+        )
+        self.notion = AsyncClient(
+            auth=self.notion_token,
+            client=http,
+            timeout_ms=int(self.timeout * 1000),
+        )
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+        if self.notion is not None:
+            await self.notion.aclose()
+            self.notion = None
@@ -1,5 +1,6 @@
 from aiogram.types import ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.utils.keyboard import ReplyKeyboardBuilder, InlineKeyboardBuilder
+from aiogram.filters.callback_data import CallbackData
 
 reply_keyboard_markup = ReplyKeyboardMarkup(
 	keyboard=[
@@ -35,3 +36,22 @@ async def inline_cars():
 	return  keyboard.adjust(2).as_markup()
 
 
+class TradesPage(CallbackData, prefix='trades'):
+	# kind: active | ticker, arg: тикер для kind=ticker
+	kind: str
+	arg: str = ''
+	page: int = 0
+
+
+def trades_pagination(kind: str, arg: str, page: int, pages: int):
+	keyboard = InlineKeyboardBuilder()
+	if page > 0:
+		keyboard.add(InlineKeyboardButton(
+			text='◀️', callback_data=TradesPage(kind=kind, arg=arg, page=page - 1).pack()
+		))
+	keyboard.add(InlineKeyboardButton(text=f'{page + 1}/{pages}', callback_data='noop'))
+	if page + 1 < pages:
+		keyboard.add(InlineKeyboardButton(
+			text='▶️', callback_data=TradesPage(kind=kind, arg=arg, page=page + 1).pack()
+		))
+	return keyboard.as_markup()
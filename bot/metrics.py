@@ -0,0 +1,75 @@
+import time
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware, Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import TelegramMethod
+from aiogram.types import TelegramObject
+from prometheus_client import Counter, Gauge, Histogram, start_http_server
+
+# Внешние API отвечают за десятки миллисекунд — секунды
+API_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+HANDLER_LATENCY = Histogram("bot_handler_seconds", "Время работы хендлера aiogram", ["handler"])
+TELEGRAM_LATENCY = Histogram(
+    "telegram_api_request_seconds", "Запросы бота к Bot API", ["method"], buckets=API_BUCKETS,
+)
+BYBIT_LATENCY = Histogram("bybit_request_seconds", "Запросы к Bybit REST", ["method"], buckets=API_BUCKETS)
+NOTION_LATENCY = Histogram("notion_api_request_seconds", "Запросы к Notion API", ["method"], buckets=API_BUCKETS)
+RATE_LIMITED = Counter("rate_limited_total", "Ответы 429 от внешних API", ["api"])
+ERRORS = Counter("errors_total", "Ошибки по месту возникновения", ["stage"])
+LOOP_LAG = Histogram(
+    "event_loop_lag_seconds", "Опоздание пробуждения event loop",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+CACHE_SIZE = Gauge("cache_entries", "Записей в кэшах", ["cache"])
+
+
+@contextmanager
+def observe(histogram, *labels):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        (histogram.labels(*labels) if labels else histogram).observe(time.perf_counter() - start)
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """Inner-middleware: хендлер уже выбран фильтрами, поэтому метка — имя функции, а не текст команды."""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        name = data["handler"].callback.__name__
+        start = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            ERRORS.labels("handler").inc()
+            raise
+        finally:
+            HANDLER_LATENCY.labels(name).observe(time.perf_counter() - start)
+
+
+class TelegramMetricsMiddleware(BaseRequestMiddleware):
+    """Время каждого запроса к Bot API по типу метода и счётчик 429."""
+
+    async def __call__(self, make_request: NextRequestMiddlewareType, bot: Bot, method: TelegramMethod):
+        start = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except TelegramRetryAfter:
+            RATE_LIMITED.labels("telegram").inc()
+            raise
+        finally:
+            TELEGRAM_LATENCY.labels(type(method).__name__).observe(time.perf_counter() - start)
+
+
+def start_metrics_server(port: int, host: str = "127.0.0.1"):
+    # Отдельный поток prometheus_client: /metrics не конкурирует с event loop бота
+    start_http_server(port, addr=host)
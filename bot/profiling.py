@@ -0,0 +1,202 @@
+import asyncio
+import cProfile
+import heapq
+import io
+import itertools
+import logging
+import os
+import pstats
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+
+from metrics import LOOP_LAG
+
+logger = logging.getLogger(__name__)
+
+# Список спанов текущего апдейта; gather копирует контекст в задачи, но список общий
+_spans: ContextVar[list | None] = ContextVar("profile_spans", default=None)
+
+
+@contextmanager
+def span(name: str):
+    spans = _spans.get()
+    if spans is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        spans.append((name, time.perf_counter() - start))
+
+
+async def traced(name: str, awaitable: Awaitable) -> Any:
+    with span(name):
+        return await awaitable
+
+
+def describe(update: Update) -> str:
+    if update.message and update.message.text:
+        return update.message.text.split()[0][:32]
+    if update.callback_query:
+        return f"callback:{(update.callback_query.data or '').split(':')[0][:24]}"
+    return update.event_type
+
+
+class UpdateRecord:
+    __slots__ = ("update_id", "name", "wall", "spans", "profile")
+
+    def __init__(self, update_id: int, name: str, wall: float, spans: list, profile: str | None):
+        self.update_id = update_id
+        self.name = name
+        self.wall = wall
+        self.spans = spans
+        self.profile = profile
+
+    def summary(self) -> str:
+        parts = ", ".join(f"{name}={seconds * 1000:.0f}ms" for name, seconds in self.spans)
+        return f"{self.name} #{self.update_id}: {self.wall * 1000:.0f}ms" + (f" ({parts})" if parts else "")
+
+
+class UpdateProfiler(BaseMiddleware):
+    """Outer-middleware на dp.update: время каждого апдейта и спаны ожидаемых зависимостей.
+
+    С включённым профилированием апдейт дополнительно идёт под cProfile (не больше
+    одного одновременно — второй профилировщик Python не даёт включить). Профиль
+    захватывает всё, что event loop выполнял в это время, в том числе чужие корутины.
+    Хранятся только keep самых медленных апдейтов.
+    """
+
+    def __init__(self, slow_threshold: float = 1.0, keep: int = 5, top: int = 15):
+        self.slow_threshold = slow_threshold
+        self.keep = keep
+        self.top = top
+        self.profiling = False
+
+        self._slowest: list[tuple[float, int, UpdateRecord]] = []
+        self._counter = itertools.count()
+        self._active = False
+        self.updates = 0
+        self.slow = 0
+
+    @classmethod
+    def from_env(cls) -> "UpdateProfiler":
+        profiler = cls(
+            slow_threshold=float(os.getenv("PROFILE_SLOW_SECONDS", 1)),
+            keep=int(os.getenv("PROFILE_KEEP", 5)),
+        )
+        profiler.profiling = os.getenv("PROFILE_UPDATES") == "1"
+        return profiler
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        spans: list = []
+        token = _spans.set(spans)
+        profile = self._start_profile()
+        start = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            wall = time.perf_counter() - start
+            if profile is not None:
+                profile.disable()
+                self._active = False
+            _spans.reset(token)
+            self._record(event, wall, spans, profile)
+
+    def _start_profile(self) -> cProfile.Profile | None:
+        if not self.profiling or self._active:
+            return None
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Уже работает другой профилировщик (sys.setprofile/sys.monitoring)
+            return None
+        self._active = True
+        return profile
+
+    def _record(self, update: Update, wall: float, spans: list, profile: cProfile.Profile | None):
+        self.updates += 1
+        record = UpdateRecord(update.update_id, describe(update), wall, spans, None)
+        if wall >= self.slow_threshold:
+            self.slow += 1
+            logger.warning("Медленный апдейт %s", record.summary())
+
+        if len(self._slowest) >= self.keep and wall <= self._slowest[0][0]:
+            return
+        # Статистику профиля рендерим только для тех, кто попал в топ
+        if profile is not None:
+            record.profile = self._render(profile)
+        item = (wall, next(self._counter), record)
+        if len(self._slowest) < self.keep:
+            heapq.heappush(self._slowest, item)
+        else:
+            heapq.heapreplace(self._slowest, item)
+
+    def _render(self, profile: cProfile.Profile) -> str:
+        out = io.StringIO()
+        pstats.Stats(profile, stream=out).strip_dirs().sort_stats("cumulative").print_stats(self.top)
+        return out.getvalue()
+
+    def slowest(self) -> list[UpdateRecord]:
+        return [record for _, _, record in sorted(self._slowest, reverse=True)]
+
+    def reset(self):
+        self._slowest.clear()
+        self.updates = 0
+        self.slow = 0
+
+
+class LoopLagMonitor:
+    """Задержка пробуждения event loop: если корутина спит interval, а просыпается позже,
+    значит кто-то держал loop синхронным кодом."""
+
+    def __init__(self, interval: float = 0.1, threshold: float = 0.1):
+        self.interval = interval
+        self.threshold = threshold
+        self.max_lag = 0.0
+        self.blocked = 0
+        self._task: asyncio.Task | None = None
+
+    @classmethod
+    def from_env(cls) -> "LoopLagMonitor":
+        return cls(
+            interval=float(os.getenv("LOOP_LAG_INTERVAL", 0.1)),
+            threshold=float(os.getenv("LOOP_LAG_THRESHOLD", 0.1)),
+        )
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.perf_counter() - start - self.interval)
+            LOOP_LAG.observe(lag)
+            self.max_lag = max(self.max_lag, lag)
+            if lag >= self.threshold:
+                self.blocked += 1
+                logger.warning("Event loop заблокирован на %.0f ms", lag * 1000)
+
+    def stats(self) -> dict:
+        return {"blocked": self.blocked, "max_lag_ms": round(self.max_lag * 1000, 1)}
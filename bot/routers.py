@@ -1,61 +1,72 @@
-from notion_client import AsyncClient
 import os
-from notion_client import Client
 from dotenv import load_dotenv
 
 import asyncio
+import math
+import sqlite3
+from html import escape
+
 import aiohttp
 from aiogram import F, Router
-from aiogram.filters import CommandStart, Command
-from aiogram.types import Message
-
-from trade import get_info_ticker
+from aiogram.filters import CommandStart, Command, CommandObject
+from aiogram.types import Message, CallbackQuery
+
+from clients import ClientRegistry
+from trade import MarketData
+from trades import TradesStore
+from analytics import analyze
+from metrics import ERRORS, NOTION_LATENCY, observe
+from profiling import LoopLagMonitor, UpdateProfiler, traced
 from keyboard import reply_keyboard_markup as rkm
 from keyboard import inline_keyboard_markup as ikm
 from keyboard import inline_cars
+from keyboard import TradesPage, trades_pagination
 
 load_dotenv()
 router: Router = Router()
 
+# Telegram ID через запятую: кому доступны служебные команды
+ADMIN_IDS = {int(user_id) for user_id in os.getenv("ADMIN_IDS", "").split(",") if user_id.strip()}
+
 
-async def fetch_ticker():
-    # если get_info_ticker синхронная — обернём её
-    loop = asyncio.get_running_loop()
-    return await loop.run_in_executor(None, lambda: get_info_ticker('BTCUSDT'))
+async def fetch_ticker(market: MarketData):
+    return await market.get_ticker('BTCUSDT')
 
 
-async def fetch_webhook_status():
+async def fetch_webhook_status(session: aiohttp.ClientSession):
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get('https://loggiin.pythonanywhere.com/notion-webhook') as resp:
-                return resp.status
+        async with session.get('https://loggiin.pythonanywhere.com/notion-webhook') as resp:
+            return resp.status
     except Exception as e:
         return f"Error: {e}"
 
 
 
-async def fetch_notion_status(page_id, token):
+async def fetch_notion_status(notion, page_id):
     try:
-        notion = AsyncClient(auth=token)
-        page = await notion.pages.retrieve(page_id=page_id)
+        with observe(NOTION_LATENCY, "pages.retrieve"):
+            page = await notion.pages.retrieve(page_id=page_id)
         return "Connected" if page else "Failed"
     except Exception as e:
+        ERRORS.labels("notion").inc()
         return f"Error: {e}"
 
 
 @router.message(CommandStart())
-async def cmd_start(message: Message):
+async def cmd_start(message: Message, clients: ClientRegistry, market: MarketData):
     user_id = message.from_user.id
     user_name = message.from_user.first_name
     chat_id = message.chat.id
 
     # Параллельный запуск задач
-    ticker_task = fetch_ticker()
-    notion_task = fetch_notion_status(os.getenv("PARENT_PAGE_ID"), os.getenv("NOTION_TOKEN"))
-    webhook_task = fetch_webhook_status()
+    ticker_task = fetch_ticker(market)
+    notion_task = fetch_notion_status(clients.notion, os.getenv("PARENT_PAGE_ID"))
+    webhook_task = fetch_webhook_status(clients.session)
 
     tiker, notion_status, webhook_status = await asyncio.gather(
-        ticker_task, notion_task, webhook_task
+        traced("fetch_ticker", ticker_task),
+        traced("fetch_notion_status", notion_task),
+        traced("fetch_webhook_status", webhook_task),
     )
 
     response = (
@@ -70,33 +81,32 @@ async def cmd_start(message: Message):
     await message.answer(response, parse_mode="Markdown")
 
 @router.message(F.text.startswith("/myinfo"))
-async def myinfo(message: Message):
+async def myinfo(message: Message, clients: ClientRegistry):
     telegram_id = str(message.from_user.id)
 
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(
-                f"http://127.0.0.1:8000/api/user-info/?telegram_id={telegram_id}"
-            ) as resp:
-                if resp.status == 200:
-                    data = await resp.json()
-                    response = (
-                        f"👤 Имя: {data.get('username')}\n"
-                        f"📧 Email: {data.get('email')}\n"
-                        f"📱 Телефон: {data.get('phone_number') or 'не указан'}"
-                    )
-                    await message.answer(response)
-                elif resp.status == 404:
-                    await message.answer("❌ Ты ещё не зарегистрирован. Введи команду /register email@example.com для регистрации.")
-                else:
-                    error_data = await resp.json()
-                    await message.answer(f"⚠️ Ошибка: {error_data.get('error', 'Неизвестная ошибка')}")
+        async with clients.session.get(
+            f"http://127.0.0.1:8000/api/user-info/?telegram_id={telegram_id}"
+        ) as resp:
+            if resp.status == 200:
+                data = await resp.json()
+                response = (
+                    f"👤 Имя: {data.get('username')}\n"
+                    f"📧 Email: {data.get('email')}\n"
+                    f"📱 Телефон: {data.get('phone_number') or 'не указан'}"
+                )
+                await message.answer(response)
+            elif resp.status == 404:
+                await message.answer("❌ Ты ещё не зарегистрирован. Введи команду /register email@example.com для регистрации.")
+            else:
+                error_data = await resp.json()
+                await message.answer(f"⚠️ Ошибка: {error_data.get('error', 'Неизвестная ошибка')}")
     except Exception as e:
         await message.answer(f"🚨 Ошибка при соединении с API: {e}")
 
 
 @router.message(F.text.startswith("/register"))
-async def register_user(message: Message):
+async def register_user(message: Message, clients: ClientRegistry):
     parts = message.text.strip().split()
     if len(parts) != 2:
         await message.answer("⚠️ Используй: /register твой_email@example.com")
@@ -106,16 +116,15 @@ async def register_user(message: Message):
     telegram_id = str(message.from_user.id)
 
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                "http://127.0.0.1:8000/api/register-telegram/",
-                json={"email": email, "telegram_id": telegram_id}
-            ) as resp:
-                data = await resp.json()
-                if resp.status == 200:
-                    await message.answer("✅ Telegram ID успешно привязан!")
-                else:
-                    await message.answer(f"❌ Ошибка: {data.get('error', 'Неизвестная ошибка')}")
+        async with clients.session.post(
+            "http://127.0.0.1:8000/api/register-telegram/",
+            json={"email": email, "telegram_id": telegram_id}
+        ) as resp:
+            data = await resp.json()
+            if resp.status == 200:
+                await message.answer("✅ Telegram ID успешно привязан!")
+            else:
+                await message.answer(f"❌ Ошибка: {data.get('error', 'Неизвестная ошибка')}")
     except Exception as e:
         await message.answer(f"⚠️ Ошибка при соединении с API: {e}")
 
@@ -126,9 +135,9 @@ async def cmd_help(message: Message):
 
 
 @router.message(Command('price'))
-async def cmd_price(message: Message):
+async def cmd_price(message: Message, market: MarketData):
     ticker = message.text.split()[1].upper()
-    info = get_info_ticker(ticker)
+    info = await market.get_ticker(ticker)
     if info:
         price = float(info.get("lastPrice", "Информация о цене недоступна"))
         await message.reply(f"Текущая цена {ticker}: {price}")
@@ -136,6 +145,171 @@ async def cmd_price(message: Message):
         await message.reply("Не удалось получить информацию о цене.")
 
 
+@router.message(Command('cachestats'))
+async def cmd_cache_stats(message: Message, market: MarketData):
+    stats = market.cache.stats()
+    await message.answer(
+        f"Кэш тикеров (TTL {market.cache.ttl}s): "
+        f"hits={stats['hits']}, misses={stats['misses']}, "
+        f"coalesced={stats['coalesced']}, evictions={stats['evictions']}, size={stats['size']}"
+    )
+
+
+@router.message(Command('profile'), F.from_user.id.in_(ADMIN_IDS))
+async def cmd_profile(message: Message, command: CommandObject, profiler: UpdateProfiler, loop_lag: LoopLagMonitor):
+    action = (command.args or "top").split()[0].lower()
+
+    if action in ("on", "off"):
+        profiler.profiling = action == "on"
+        await message.answer(f"Профилирование апдейтов {'включено' if profiler.profiling else 'выключено'}.")
+        return
+    if action == "reset":
+        profiler.reset()
+        await message.answer("Статистика профилировщика сброшена.")
+        return
+
+    lag = loop_lag.stats()
+    lines = [
+        f"<b>Профилирование:</b> {'вкл' if profiler.profiling else 'выкл'}, "
+        f"апдейтов {profiler.updates}, медленных {profiler.slow}",
+        f"<b>Event loop:</b> блокировок {lag['blocked']}, макс. задержка {lag['max_lag_ms']} ms",
+    ]
+    slowest = profiler.slowest()
+    if slowest:
+        lines.append("\n<b>Самые медленные:</b>")
+        lines.extend(f"• {escape(record.summary())}" for record in slowest)
+    await message.answer("\n".join(lines), parse_mode="HTML")
+
+    # Профиль самого медленного апдейта, если он снимался
+    profiled = next((record for record in slowest if record.profile), None)
+    if profiled is not None:
+        await message.answer(f"<pre>{escape(profiled.profile[:3500])}</pre>", parse_mode="HTML")
+
+
+STATUS_EMOJI = {"Активна": "🟢", "Закрыта": "🔴", "Отменена": "⚪"}
+DEAL_EMOJI = {"Long": "📈", "Short": "📉"}
+TRADES_PAGE_SIZE = 10
+
+
+def format_trade(row) -> str:
+    parts = [
+        f"{STATUS_EMOJI.get(row['status'], '⚙️')} <b>{escape(row['ticker'] or 'Без тикера')}</b> "
+        f"{DEAL_EMOJI.get(row['deal_type'], '💼')} {escape(row['deal_type'] or '')}"
+    ]
+    if row['entry_price'] is not None:
+        parts.append(f"вход {row['entry_price']:g}")
+    if row['exit_price'] is not None:
+        parts.append(f"выход {row['exit_price']:g}")
+    if row['volume'] is not None:
+        parts.append(f"объём {row['volume']:g}")
+    if row['deal_date']:
+        year, month, day = row['deal_date'][:10].split("-")
+        parts.append(f"{day}.{month}.{year}")
+    return " · ".join(parts)
+
+
+async def render_trades(trades: TradesStore, kind: str, arg: str, page: int):
+    status, ticker = ("Активна", None) if kind == "active" else (None, arg)
+    rows, total = await trades.alist_trades(
+        status=status, ticker=ticker, offset=page * TRADES_PAGE_SIZE, limit=TRADES_PAGE_SIZE
+    )
+    if not total:
+        return "Сделок не найдено.", None
+
+    title = "Активные сделки" if kind == "active" else f"Сделки {escape(ticker)}"
+    text = f"<b>{title}</b> ({total}):\n\n" + "\n".join(format_trade(row) for row in rows)
+    return text, trades_pagination(kind, arg, page, math.ceil(total / TRADES_PAGE_SIZE))
+
+
+@router.message(Command('trades'))
+async def cmd_trades(message: Message, trades: TradesStore):
+    try:
+        text, markup = await render_trades(trades, "active", "", 0)
+    except sqlite3.Error as e:
+        await message.answer(f"⚠️ Локальная база сделок недоступна: {e}")
+        return
+    await message.answer(text, parse_mode="HTML", reply_markup=markup)
+
+
+@router.message(Command('ticker'))
+async def cmd_ticker_trades(message: Message, command: CommandObject, trades: TradesStore):
+    if not command.args:
+        await message.answer("⚠️ Используй: /ticker BTCUSDT")
+        return
+
+    ticker = command.args.split()[0].upper()
+    try:
+        text, markup = await render_trades(trades, "ticker", ticker, 0)
+    except sqlite3.Error as e:
+        await message.answer(f"⚠️ Локальная база сделок недоступна: {e}")
+        return
+    await message.answer(text, parse_mode="HTML", reply_markup=markup)
+
+
+@router.callback_query(TradesPage.filter())
+async def trades_page(callback: CallbackQuery, callback_data: TradesPage, trades: TradesStore):
+    try:
+        text, markup = await render_trades(trades, callback_data.kind, callback_data.arg, callback_data.page)
+    except sqlite3.Error as e:
+        await callback.answer(f"⚠️ Локальная база сделок недоступна: {e}", show_alert=True)
+        return
+    await callback.message.edit_text(text, parse_mode="HTML", reply_markup=markup)
+    await callback.answer()
+
+
+@router.callback_query(F.data == 'noop')
+async def noop(callback: CallbackQuery):
+    await callback.answer()
+
+
+@router.message(Command('pnl'))
+async def cmd_pnl(message: Message, trades: TradesStore):
+    try:
+        rows = await trades.apnl_summary()
+    except sqlite3.Error as e:
+        await message.answer(f"⚠️ Локальная база сделок недоступна: {e}")
+        return
+
+    if not rows:
+        await message.answer("Закрытых сделок пока нет.")
+        return
+
+    lines = [f"{'🟢' if row['pnl'] >= 0 else '🔴'} <b>{escape(row['ticker'] or 'Без тикера')}</b>: "
+             f"{row['pnl']:+.2f} ({row['trades']} сд.)" for row in rows]
+    total = sum(row['pnl'] for row in rows)
+    lines.append(f"\n<b>Итого:</b> {total:+.2f}")
+    await message.answer("\n".join(lines), parse_mode="HTML")
+
+
+@router.message(Command('stats'))
+async def cmd_stats(message: Message, trades: TradesStore, market: MarketData):
+    try:
+        stats = await analyze(trades, market)
+    except sqlite3.Error as e:
+        await message.answer(f"⚠️ Локальная база сделок недоступна: {e}")
+        return
+    except Exception as e:
+        await message.answer(f"⚠️ Не удалось посчитать аналитику: {e}")
+        return
+
+    if not stats["trades"]:
+        await message.answer("Сделок пока нет.")
+        return
+
+    lines = [
+        f"📊 <b>Сделки:</b> {stats['trades']} (активных {stats['active']}, закрытых {stats['closed']})",
+        f"💰 <b>Реализованный PnL:</b> {stats['realized']:+.2f}",
+        f"📈 <b>Нереализованный PnL:</b> {stats['unrealized']:+.2f}"
+        + (f" (без цены: {stats['unpriced']})" if stats['unpriced'] else ""),
+        f"🏆 <b>Win rate:</b> {stats['win_rate']:.0%}",
+        f"📉 <b>Макс. просадка:</b> {stats['max_drawdown']:.2f}",
+    ]
+    if stats["exposure"]:
+        lines.append("\n<b>Экспозиция:</b>")
+        lines.extend(f"• {escape(ticker)}: {value:+.2f}" for ticker, value in stats["exposure"].items())
+    await message.answer("\n".join(lines), parse_mode="HTML")
+
+
 @router.message(Command('get_photo'))
 async def get_photo(message: Message):
     await message.answer_photo(photo='', caption='')
@@ -3,19 +3,75 @@ import os
 
 from dotenv import load_dotenv
 from aiogram import Bot, Dispatcher
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
 from routers import router
+from clients import ClientRegistry
+from trade import MarketData
+from stream import PriceStream
+from trades import TradesStore
+from server import run_webhook
+from profiling import LoopLagMonitor, UpdateProfiler
+from metrics import CACHE_SIZE, HandlerMetricsMiddleware, TelegramMetricsMiddleware, start_metrics_server
 
 # Загрузка переменных
 load_dotenv()
 
 TELEGRAM_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
+# Свой Bot API сервер (или локальный фейк для бенчмарка)
+TELEGRAM_API_URL = os.getenv('TELEGRAM_API_URL')
 
-bot = Bot(token=TELEGRAM_TOKEN)
-dp = Dispatcher()
+# polling | webhook
+BOT_MODE = os.getenv('BOT_MODE', 'polling')
+WEBHOOK_BASE_URL = os.getenv('BOT_WEBHOOK_URL', '')
+WEBHOOK_PATH = os.getenv('BOT_WEBHOOK_PATH', '/telegram-webhook')
+WEBHOOK_SECRET = os.getenv('BOT_WEBHOOK_SECRET')
+WEBHOOK_HOST = os.getenv('BOT_WEBHOOK_HOST', '0.0.0.0')
+WEBHOOK_PORT = int(os.getenv('BOT_WEBHOOK_PORT', 8080))
+# Локальный порт для /metrics, без него метрики не отдаются
+METRICS_PORT = os.getenv('BOT_METRICS_PORT')
+
+session = AiohttpSession(api=TelegramAPIServer.from_base(TELEGRAM_API_URL)) if TELEGRAM_API_URL else None
+bot = Bot(token=TELEGRAM_TOKEN, session=session)
+bot.session.middleware(TelegramMetricsMiddleware())
+clients = ClientRegistry.from_env()
+# Поток цен по WebSocket включается PRICE_STREAM=1, без него цены идут из REST
+stream = PriceStream.from_env() if os.getenv('PRICE_STREAM') == '1' else None
+market = MarketData.from_env(stream=stream)
+trades = TradesStore.from_env()
+profiler = UpdateProfiler.from_env()
+loop_lag = LoopLagMonitor.from_env()
+# clients, market, trades и профилировщик попадают в хендлеры через workflow_data диспетчера
+dp = Dispatcher(clients=clients, market=market, trades=trades, profiler=profiler, loop_lag=loop_lag)
+dp.update.outer_middleware(profiler)
+dp.message.middleware(HandlerMetricsMiddleware())
+dp.callback_query.middleware(HandlerMetricsMiddleware())
+dp.startup.register(clients.start)
+dp.shutdown.register(clients.close)
+dp.startup.register(loop_lag.start)
+dp.shutdown.register(loop_lag.stop)
+if stream is not None:
+	dp.startup.register(stream.start)
+	dp.shutdown.register(stream.stop)
 
 async def main():
 	dp.include_router(router)
-	await dp.start_polling(bot)
+	if METRICS_PORT:
+		CACHE_SIZE.labels('tickers').set_function(lambda: len(market.cache))
+		start_metrics_server(int(METRICS_PORT))
+	if BOT_MODE == 'webhook':
+		await run_webhook(
+			dp, bot,
+			base_url=WEBHOOK_BASE_URL,
+			path=WEBHOOK_PATH,
+			host=WEBHOOK_HOST,
+			port=WEBHOOK_PORT,
+			secret_token=WEBHOOK_SECRET,
+		)
+	else:
+		# Вебхук от прошлого запуска в режиме webhook блокирует getUpdates (Conflict), апдейты при этом не теряются
+		await bot.delete_webhook()
+		await dp.start_polling(bot)
 
 if __name__ == '__main__':
 	try:
@@ -0,0 +1,50 @@
+import asyncio
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+
+
+def create_webhook_app(dispatcher: Dispatcher, bot: Bot, path: str, secret_token: str | None = None) -> web.Application:
+    app = web.Application()
+    # handle_in_background: Telegram сразу получает 200, апдейты обрабатываются параллельно
+    SimpleRequestHandler(
+        dispatcher=dispatcher,
+        bot=bot,
+        secret_token=secret_token,
+        handle_in_background=True,
+    ).register(app, path=path)
+    # startup/shutdown диспетчера вызываются вместе с aiohttp-приложением
+    setup_application(app, dispatcher, bot=bot)
+    return app
+
+
+async def run_webhook(
+    dispatcher: Dispatcher,
+    bot: Bot,
+    base_url: str,
+    path: str,
+    host: str,
+    port: int,
+    secret_token: str | None = None,
+):
+    # Без публичного адреса Telegram получил бы относительный URL вида "/telegram-webhook"
+    if not base_url:
+        raise ValueError("BOT_WEBHOOK_URL не задан — нужен публичный https-адрес для режима webhook")
+
+    async def set_webhook():
+        await bot.set_webhook(f"{base_url}{path}", secret_token=secret_token)
+
+    dispatcher.startup.register(set_webhook)
+
+    app = create_webhook_app(dispatcher, bot, path, secret_token)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, host=host, port=port)
+    await site.start()
+
+    try:
+        await asyncio.Event().wait()
+    finally:
+        # cleanup дожидается shutdown-хендлеров диспетчера и закрывает сессию бота
+        await runner.cleanup()
@@ -0,0 +1,133 @@
+import asyncio
+import json
+import logging
+import os
+import time
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+BYBIT_WS_URL = "wss://stream.bybit.com/v5/public/spot"
+BYBIT_WS_TESTNET_URL = "wss://stream-testnet.bybit.com/v5/public/spot"
+
+# Bybit принимает не больше 10 топиков в одном subscribe для spot
+SUBSCRIBE_CHUNK = 10
+
+
+class PriceStream:
+    """Фоновая подписка на публичный поток тикеров Bybit, последние цены держим в памяти.
+
+    URL задаётся параметром, поэтому поток можно гонять против локального фейкового WS-сервера,
+    см. check_stream.py.
+    """
+
+    def __init__(
+        self,
+        symbols: list[str],
+        url: str = BYBIT_WS_TESTNET_URL,
+        ping_interval: float = 20.0,
+        reconnect_delay: float = 1.0,
+        max_reconnect_delay: float = 30.0,
+        max_age: float = 30.0,
+    ):
+        self.symbols = {symbol.upper() for symbol in symbols}
+        self.url = url
+        self.ping_interval = ping_interval
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.max_age = max_age
+
+        self.prices: dict[str, dict] = {}
+        # symbol -> time.monotonic() последнего тикера
+        self.received: dict[str, float] = {}
+        self.connected = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    @classmethod
+    def from_env(cls) -> "PriceStream":
+        testnet = os.getenv("BYBIT_TESTNET", "1") == "1"
+        symbols = os.getenv("PRICE_STREAM_SYMBOLS", "BTCUSDT,ETHUSDT").split(",")
+        return cls(
+            symbols=[symbol.strip() for symbol in symbols if symbol.strip()],
+            url=os.getenv("BYBIT_WS_URL", BYBIT_WS_TESTNET_URL if testnet else BYBIT_WS_URL),
+            max_age=float(os.getenv("PRICE_STREAM_MAX_AGE", 30)),
+        )
+
+    def get(self, symbol: str) -> dict | None:
+        # None — символ не подписан, цена ещё не пришла или устарела, тогда идём в REST.
+        # Пока поток оборван (и весь backoff), последней цене не доверяем
+        if not self.connected.is_set():
+            return None
+        symbol = symbol.upper()
+        received = self.received.get(symbol)
+        if received is None or time.monotonic() - received > self.max_age:
+            return None
+        return self.prices.get(symbol)
+
+    def handle(self, message: dict):
+        topic = message.get("topic", "")
+        if not topic.startswith("tickers."):
+            return
+
+        data = message.get("data") or {}
+        symbol = data.get("symbol")
+        if symbol in self.symbols and "lastPrice" in data:
+            self.prices[symbol] = {"symbol": symbol, "lastPrice": data["lastPrice"]}
+            self.received[symbol] = time.monotonic()
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        self.connected.clear()
+
+    async def _run(self):
+        delay = self.reconnect_delay
+        async with aiohttp.ClientSession() as session:
+            while True:
+                try:
+                    async with session.ws_connect(self.url, heartbeat=None) as ws:
+                        await self._subscribe(ws)
+                        self.connected.set()
+                        delay = self.reconnect_delay
+                        await self._read(ws)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.warning("Поток цен Bybit оборвался: %s", e)
+
+                self.connected.clear()
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.max_reconnect_delay)
+
+    async def _subscribe(self, ws: aiohttp.ClientWebSocketResponse):
+        topics = [f"tickers.{symbol}" for symbol in sorted(self.symbols)]
+        for i in range(0, len(topics), SUBSCRIBE_CHUNK):
+            await ws.send_json({"op": "subscribe", "args": topics[i:i + SUBSCRIBE_CHUNK]})
+
+    async def _read(self, ws: aiohttp.ClientWebSocketResponse):
+        ping = asyncio.create_task(self._ping(ws))
+        try:
+            async for msg in ws:
+                if msg.type == aiohttp.WSMsgType.TEXT:
+                    self.handle(json.loads(msg.data))
+                elif msg.type == aiohttp.WSMsgType.ERROR:
+                    raise ws.exception()
+        finally:
+            ping.cancel()
+
+    async def _ping(self, ws: aiohttp.ClientWebSocketResponse):
+        # Bybit рвёт соединение без {"op": "ping"} примерно раз в 20 секунд
+        while True:
+            await asyncio.sleep(self.ping_interval)
+            await ws.send_json({"op": "ping"})
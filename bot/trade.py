@@ -1,26 +1,121 @@
+import asyncio
+import logging
+import os
+import time
+
 from pybit.unified_trading import HTTP
 
+from cache import TTLCache
+from metrics import BYBIT_LATENCY, observe
+from stream import PriceStream
+
+logger = logging.getLogger(__name__)
+
+KEYS_COPY = (
+    "symbol",
+    "lastPrice",
+)
+
+
+def _copy_keys(item: dict) -> dict:
+    return {key: item[key] for key in KEYS_COPY if key in item}
+
+
+class MarketData:
+    """Спотовые тикеры Bybit: одна сессия, один bulk-запрос на всех, без блокировки event loop."""
+
+    def __init__(
+        self,
+        testnet: bool = True,
+        max_age: float = 1.0,
+        ttl: float = 1.0,
+        cache_size: int = 1024,
+        stream: PriceStream | None = None,
+    ):
+        self.session = HTTP(testnet=testnet)
+        self.max_age = max_age
+        self.cache = TTLCache(ttl=ttl, maxsize=cache_size)
+        self.stream = stream
+
+        self._snapshot: dict[str, dict] = {}
+        self._updated = 0.0
+        self._refresh: asyncio.Task | None = None
+
+    @classmethod
+    def from_env(cls, stream: PriceStream | None = None) -> "MarketData":
+        return cls(
+            testnet=os.getenv("BYBIT_TESTNET", "1") == "1",
+            max_age=float(os.getenv("MARKET_SNAPSHOT_MAX_AGE", 1)),
+            ttl=float(os.getenv("TICKER_CACHE_TTL", 1)),
+            cache_size=int(os.getenv("TICKER_CACHE_SIZE", 1024)),
+            stream=stream,
+        )
+
+    def fetch_ticker(self, ticker: str) -> dict:
+        with observe(BYBIT_LATENCY, "get_tickers"):
+            response: dict = self.session.get_tickers(
+                category="spot",
+                symbol=ticker,
+            )
+        if response["retCode"] != 0:
+            return {}
 
-def get_info_ticker(ticker) -> dict | str:
-    session = HTTP(testnet=True)
-    response: dict = session.get_tickers(
-        category="spot",
-        symbol=ticker,
-    )
+        result_list = response.get("result", {}).get("list", [])
+        return _copy_keys(result_list[0]) if result_list else {}
 
-    keys_copy = [
-        "symbol",
-        "lastPrice",
-    ]
+    def fetch_snapshot(self) -> dict[str, dict]:
+        with observe(BYBIT_LATENCY, "get_tickers"):
+            response: dict = self.session.get_tickers(category="spot")
+        if response["retCode"] != 0:
+            logger.warning("Bybit get_tickers: %s", response.get("retMsg"))
+            return {}
 
-    info = {}
-    if response["retCode"] == 0:
         result_list = response.get("result", {}).get("list", [])
-        if result_list and len(result_list) > 0:
-            for key in keys_copy:
-                if key in result_list[0]:
-                    info[key] = result_list[0][key]
-    else:
-        "Информации о паре нет!"
-
-    return info
+        return {item["symbol"]: _copy_keys(item) for item in result_list if "symbol" in item}
+
+    async def snapshot(self) -> dict[str, dict]:
+        if time.monotonic() - self._updated < self.max_age:
+            return self._snapshot
+
+        # Все конкурентные запросы ждут одно и то же обновление
+        if self._refresh is None:
+            self._refresh = asyncio.create_task(self._do_refresh())
+        return await asyncio.shield(self._refresh)
+
+    async def _do_refresh(self) -> dict[str, dict]:
+        try:
+            snapshot = await asyncio.to_thread(self.fetch_snapshot)
+        except Exception as e:
+            if not self._snapshot:
+                raise
+            logger.warning("Не удалось обновить тикеры, отдаём прошлый снимок: %s", e)
+            return self._snapshot
+        finally:
+            self._refresh = None
+
+        self._snapshot = snapshot
+        self._updated = time.monotonic()
+        return snapshot
+
+    async def get_ticker(self, ticker: str) -> dict:
+        ticker = ticker.upper()
+        if self.stream is not None:
+            info = self.stream.get(ticker)
+            if info is not None:
+                return info
+        return await self.cache.get(ticker, lambda: self._load_ticker(ticker))
+
+    async def _load_ticker(self, ticker: str) -> dict:
+        snapshot = await self.snapshot()
+        return snapshot.get(ticker, {})
+
+
+_default: MarketData | None = None
+
+
+def get_info_ticker(ticker) -> dict:
+    # Синхронный вариант для скриптов, хендлеры бота используют MarketData
+    global _default
+    if _default is None:
+        _default = MarketData.from_env()
+    return _default.fetch_ticker(ticker)
@@ -0,0 +1,81 @@
+import asyncio
+import os
+import sqlite3
+import threading
+
+# Схему и индексы (ticker, status, deal_date) создаёт зеркало базы сделок в notion/mirror.py
+TRADE_COLUMNS = "page_id, ticker, status, deal_type, deal_date, entry_price, exit_price, volume, fees"
+
+# Реализованный PnL закрытой сделки: Short зарабатывает на падении цены
+PNL_SQL = """
+    (exit_price - entry_price) * COALESCE(volume, 0) * (CASE WHEN deal_type = 'Short' THEN -1 ELSE 1 END)
+    - COALESCE(fees, 0)
+"""
+
+
+class TradesStore:
+    """Чтение сделок из локального SQLite-зеркала базы Notion, без запросов к Notion."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._db: sqlite3.Connection | None = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "TradesStore":
+        return cls(os.getenv("TRADES_DB_PATH", "trades.db"))
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            # Только чтение: пишет зеркало на стороне вебхука
+            self._db = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+            self._db.row_factory = sqlite3.Row
+        return self._db
+
+    def _fetch(self, sql: str, params: tuple = ()) -> list[sqlite3.Row]:
+        with self._lock:
+            return self._connect().execute(sql, params).fetchall()
+
+    def list_trades(
+        self, status: str | None = None, ticker: str | None = None, offset: int = 0, limit: int = 10
+    ) -> tuple[list[sqlite3.Row], int]:
+        where = ["archived = 0"]
+        params = []
+        if status:
+            where.append("status = ?")
+            params.append(status)
+        if ticker:
+            where.append("ticker = ?")
+            params.append(ticker)
+        condition = " AND ".join(where)
+
+        total = self._fetch(f"SELECT count(*) FROM trades WHERE {condition}", tuple(params))[0][0]
+        rows = self._fetch(
+            f"SELECT {TRADE_COLUMNS} FROM trades WHERE {condition} "
+            f"ORDER BY deal_date DESC, page_id LIMIT ? OFFSET ?",
+            (*params, limit, offset),
+        )
+        return rows, total
+
+    def pnl_summary(self) -> list[sqlite3.Row]:
+        return self._fetch(
+            f"SELECT ticker, count(*) AS trades, sum({PNL_SQL}) AS pnl "
+            f"FROM trades WHERE archived = 0 AND status = 'Закрыта' "
+            f"AND entry_price IS NOT NULL AND exit_price IS NOT NULL "
+            f"GROUP BY ticker ORDER BY pnl DESC"
+        )
+
+    def all_trades(self) -> list[sqlite3.Row]:
+        return self._fetch(
+            "SELECT ticker, status, deal_type, deal_date, entry_price, exit_price, volume, fees "
+            "FROM trades WHERE archived = 0"
+        )
+
+    async def alist_trades(self, *args, **kwargs) -> tuple[list[sqlite3.Row], int]:
+        return await asyncio.to_thread(self.list_trades, *args, **kwargs)
+
+    async def apnl_summary(self) -> list[sqlite3.Row]:
+        return await asyncio.to_thread(self.pnl_summary)
+
+    async def aall_trades(self) -> list[sqlite3.Row]:
+        return await asyncio.to_thread(self.all_trades)
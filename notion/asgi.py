@@ -0,0 +1,412 @@
+import os
+import json
+import time
+import asyncio
+
+from typing import List
+
+import aiohttp
+from notion_client import AsyncClient
+from dotenv import find_dotenv, load_dotenv, set_key
+
+from utilites import Utils
+from ratelimit import AsyncTokenBucket, call_with_retry_async
+from sender import TELEGRAM_API_URL, split_message
+from dedup import DedupIndex
+from routing import EventFilter, event_database
+from subscriptions import SubscriptionTable
+from properties import extract_page_values
+from state import PageStateCache, diff_values
+from signature import SignatureVerifier, is_handshake
+from logsetup import bind_event, log_payload, setup_logging
+import metrics
+from metrics import (
+    ERRORS, EVENTS, EVENT_LATENCY, RATE_LIMITED, TELEGRAM_LATENCY, WEBHOOK_LATENCY, observe,
+)
+
+# Инициализация
+ENV_PATH = find_dotenv() or os.path.join(os.path.dirname(os.path.abspath(__file__)), '.env')
+load_dotenv(ENV_PATH)
+logger = setup_logging()
+
+NOTION_API_URL = os.getenv("NOTION_API_URL", "https://api.notion.com")
+
+
+class NotionEventApp:
+    """ASGI-вариант /notion-webhook (запуск: uvicorn asgi:app).
+
+    Те же маршруты и обработка событий, что в run.py, но в одном event loop:
+    Notion через AsyncClient, Telegram через общую aiohttp-сессию.
+    """
+
+    def __init__(
+        self,
+        notion_token: str | None,
+        telegram_token: str | None,
+        chat_id: str | None,
+        telegram_api_url: str = TELEGRAM_API_URL,
+        concurrency: int = 16,
+        maxsize: int = 1000,
+        notion_rate: float = 3.0,
+        verifier: SignatureVerifier | None = None,
+        max_body: int = 1024 * 1024,
+    ):
+        self.notion_token = notion_token
+        self.telegram_token = telegram_token
+        self.chat_id = chat_id
+        self.telegram_api_url = telegram_api_url.rstrip("/")
+        self.concurrency = concurrency
+        self.maxsize = maxsize
+        self.notion_rate = notion_rate
+        # verifier=None — проверка подписи выключена
+        self.verifier = verifier
+        self.max_body = max_body
+
+        self.notion: AsyncClient | None = None
+        self.session: aiohttp.ClientSession | None = None
+        self.limiter: AsyncTokenBucket | None = None
+        self._slots: asyncio.Semaphore | None = None
+        self._tasks: set[asyncio.Task] = set()
+        self.dedup = DedupIndex(window=float(os.getenv("NOTION_DEDUP_WINDOW", 3600)))
+        self.subscriptions = SubscriptionTable.from_env()
+        self.filter = EventFilter.from_env(self.subscriptions.databases())
+        # Только память процесса: зеркала SQLite в ASGI-варианте нет
+        self.states = PageStateCache(maxsize=int(os.getenv("NOTION_STATE_CACHE_SIZE", 10_000)))
+
+        self.accepted = 0
+        self.rejected = 0
+        self.processed = 0
+        self.failed = 0
+        self.sent = 0
+
+    @classmethod
+    def from_env(cls) -> "NotionEventApp":
+        return cls(
+            os.getenv("NOTION_TOKEN"),
+            os.getenv("TELEGRAM_BOT_TOKEN"),
+            os.getenv("TELEGRAM_CHAT_ID"),
+            telegram_api_url=os.getenv("TELEGRAM_API_URL", TELEGRAM_API_URL),
+            concurrency=int(os.getenv("NOTION_WORKERS", 16)),
+            maxsize=int(os.getenv("NOTION_QUEUE_SIZE", 1000)),
+            notion_rate=float(os.getenv("NOTION_RATE_LIMIT", 3)),
+            verifier=SignatureVerifier.from_env() if os.getenv("NOTION_VERIFY_SIGNATURE", "1") == "1" else None,
+            max_body=int(os.getenv("NOTION_MAX_BODY", 1024 * 1024)),
+        )
+
+    async def startup(self):
+        self.notion = AsyncClient(auth=self.notion_token, base_url=NOTION_API_URL)
+        self.session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=20))
+        self.limiter = AsyncTokenBucket(rate=self.notion_rate, capacity=max(self.notion_rate, 1))
+        self._slots = asyncio.Semaphore(self.concurrency)
+        metrics.track_queue("events", lambda: len(self._tasks))
+
+    async def shutdown(self, timeout: float = 10.0):
+        # Дожидаемся уже принятых событий, затем закрываем клиентов
+        if self._tasks:
+            await asyncio.wait(self._tasks, timeout=timeout)
+        await self.session.close()
+        await self.notion.aclose()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+
+        if scope["path"] == "/metrics":
+            body, content_type = metrics.render()
+            await self._send(send, 200, body, content_type.encode())
+            return
+
+        if scope["path"] != "/notion-webhook":
+            await self._respond(send, 404, {"error": "Not found"})
+            return
+
+        started = time.perf_counter()
+        status = 500
+        try:
+            if scope["method"] == "GET":
+                status = 200
+                await self._respond(send, status, {
+                    "status": "active",
+                    "queue": self.stats(),
+                    "dedup": self.dedup.stats(),
+                    "filter": self.filter.stats(),
+                    "states": self.states.stats(),
+                })
+            elif scope["method"] == "POST":
+                status, payload = await self._handle_post(scope, receive)
+                await self._respond(send, status, payload)
+            else:
+                status = 405
+                await self._respond(send, status, {"error": "Method not allowed"})
+        except Exception as e:
+            logger.exception("Webhook error")
+            ERRORS.labels("webhook").inc()
+            await self._respond(send, 500, {"error": str(e)})
+        finally:
+            WEBHOOK_LATENCY.labels(scope["method"], status).observe(time.perf_counter() - started)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await self.startup()
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await self.shutdown()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _handle_post(self, scope, receive) -> tuple[int, dict]:
+        headers = dict(scope["headers"])
+        if not headers.get(b"content-type", b"").startswith(b"application/json"):
+            return 400, {"error": "Content-Type must be application/json"}
+
+        # HMAC считается по мере прихода чанков, JSON разбирается только после проверки подписи
+        digest = self.verifier.stream() if self.verifier is not None else None
+        body = await self._read_body(receive, digest, self.max_body)
+        if body is None:
+            return 413, {"error": "Payload too large"}
+
+        signature = headers.get(b"x-notion-signature", b"").decode("latin-1")
+        signed = digest is None or digest.matches(signature)
+        if not signed and not is_handshake(body):
+            EVENTS.labels("bad_signature").inc()
+            logger.warning("🔏 Неверная подпись X-Notion-Signature, запрос отклонён")
+            return 403, {"error": "Invalid signature"}
+
+        try:
+            data = json.loads(body)
+        except ValueError:
+            return 400, {"error": "Invalid JSON"}
+        log_payload(logger, data)
+
+        if 'verification_token' in data:
+            logger.info(f"📬 Получен verification_token: {data['verification_token'][:8]}...")
+            # Как в run.py: токен принимается, только пока секрета нет
+            if self.verifier is not None and self.verifier.claim(data['verification_token']):
+                set_key(ENV_PATH, 'NOTION_WEBHOOK_TOKEN', data['verification_token'])
+                logger.info("🔐 verification_token сохранён в %s", ENV_PATH)
+            elif not signed:
+                EVENTS.labels("bad_signature").inc()
+                logger.warning("🔏 Неподписанное рукопожатие при заданном секрете, запрос отклонён")
+                return 403, {"error": "Invalid signature"}
+            return 200, {"challenge": data['verification_token']}
+
+        if data.get('type') == 'webhook_verification':
+            logger.info(f"📡 Верификация вебхука прошла успешно: challenge={data['challenge']}")
+            return 200, {"challenge": data['challenge']}
+
+        # Без подписи пропускаются только рукопожатия выше
+        if not signed:
+            EVENTS.labels("bad_signature").inc()
+            return 403, {"error": "Invalid signature"}
+
+        if not self.filter.accept(data):
+            EVENTS.labels("filtered").inc()
+            return 200, {"status": "ignored"}
+
+        if self.dedup.check(data):
+            logger.info("🔁 Повторная доставка события %s, пропускаем", data.get('id'))
+            EVENTS.labels("duplicate").inc()
+            return 200, {"status": "duplicate"}
+
+        if len(self._tasks) >= self.maxsize:
+            self.dedup.forget(data)
+            self.rejected += 1
+            EVENTS.labels("rejected").inc()
+            logger.warning("🚧 Очередь событий переполнена, событие отклонено")
+            return 503, {"error": "Queue is full"}
+
+        self.accepted += 1
+        EVENTS.labels("queued").inc()
+        task = asyncio.create_task(self._process(data))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return 200, {"status": "queued"}
+
+    @staticmethod
+    async def _read_body(receive, digest=None, limit: int | None = None) -> bytes | None:
+        chunks = []
+        size = 0
+        while True:
+            message = await receive()
+            chunk = message.get("body", b"")
+            size += len(chunk)
+            if limit is not None and size > limit:
+                return None
+            if digest is not None:
+                digest.update(chunk)
+            chunks.append(chunk)
+            if not message.get("more_body"):
+                return b"".join(chunks)
+
+    @classmethod
+    async def _respond(cls, send, status: int, payload: dict):
+        await cls._send(send, status, json.dumps(payload, ensure_ascii=False).encode("utf-8"))
+
+    @staticmethod
+    async def _send(send, status: int, body: bytes, content_type: bytes = b"application/json"):
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(b"content-type", content_type), (b"content-length", str(len(body)).encode())],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    async def _process(self, raw: dict):
+        async with self._slots:
+            try:
+                with bind_event(raw), observe(EVENT_LATENCY):
+                    await self.process_notion_event(raw)
+                self.processed += 1
+            except Exception:
+                logger.exception("Ошибка обработки события")
+                ERRORS.labels("event").inc()
+                self.failed += 1
+
+    async def fetch_page(self, page_id: str) -> dict | None:
+        try:
+            return await call_with_retry_async(self.limiter, self.notion.pages.retrieve, page_id=page_id)
+        except Exception as e:
+            logger.error(f"❌ Не удалось получить страницу {page_id}: {e}")
+            return None
+
+    async def resolve_block(self, db_id, block_id) -> dict | None:
+        try:
+            block = await call_with_retry_async(self.limiter, self.notion.blocks.retrieve, block_id=block_id)
+        except Exception as e:
+            logger.warning(f"❌ Ошибка при обработке блока {block_id}: {e}")
+            return None
+
+        parent = block.get('parent', {})
+        if ((parent.get('type') == 'database_id' and parent.get('database_id') == db_id)
+                and block.get("type") == 'child_page'):
+            return await self.fetch_page(block.get("id"))
+        return None
+
+    def collect_page(self, page: dict, result: List[dict], changes: List[dict | None]):
+        # Как в run.py: целиком при неизвестном прежнем состоянии, иначе разница; пустая — уже отправлено
+        values = extract_page_values(page.get("properties", {}))
+        old = self.states.swap(page["id"], values, page.get("last_edited_time"))
+        diff = diff_values(old, values) if old is not None else None
+        if diff != {}:
+            result.append(values)
+            changes.append(diff)
+
+    def is_page_in_database(self, page: dict | None) -> bool:
+        if not page or page.get("parent", {}).get("type") != "database_id":
+            return False
+        # Как в run.py: база data_source-событий сверяется по самой странице
+        return self.filter.accept_database(page["parent"].get("database_id"))
+
+    async def process_notion_event(self, raw: dict) -> List[dict]:
+        event_type = raw.get('type')
+        entity = raw.get('entity', {})
+        data = raw.get('data', {})
+        entity_id = entity.get('id')
+
+        logger.info("📌 Событие: %s (entity: %s, id: %s)", event_type, entity.get('type'), entity_id)
+
+        result: List[dict] = []
+        changes: List[dict | None] = []
+        database_id = entity_id if entity.get('type') == "database" else event_database(raw)
+
+        if event_type == "database.content_updated":
+            ids = [bl.get('id') for bl in data.get("updated_blocks", [])]
+            found = await asyncio.gather(*(self.resolve_block(entity_id, block_id) for block_id in ids))
+            for page in found:
+                if page:
+                    self.collect_page(page, result, changes)
+
+        elif event_type in ("page.created", "page.properties_updated"):
+            page = await self.fetch_page(entity_id)
+            if self.is_page_in_database(page):
+                database_id = page["parent"]["database_id"]
+                self.collect_page(page, result, changes)
+
+        elif event_type == "page.deleted":
+            self.states.forget(entity_id)
+
+        elif event_type == "page.content_updated":
+            if self.is_page_in_database(await self.fetch_page(entity_id)):
+                logger.info("✏️ Изменено содержимое страницы %.8s — но свойства остались прежними", entity_id)
+
+        elif event_type not in ("database.schema_updated", "page.moved", "page.undeleted"):
+            logger.warning("⚠️ Необработанный тип события: %s", event_type)
+
+        # Отправка Telegram, только если есть что показать
+        if result:
+            await self.notify(database_id, result, changes)
+        return result
+
+    async def notify(self, database_id: str | None, result: List[dict], changes: List[dict | None] | None = None):
+        # Чаты/темы подписок получают свои записи параллельно, в пределах чата порядок сохраняется
+        sends = []
+        for (chat_id, thread_id), indexes in self.subscriptions.route(database_id, result).items():
+            message = Utils.format_notion_telegram_message(
+                [result[i] for i in indexes],
+                changes=[changes[i] for i in indexes] if changes is not None else None,
+            )
+            sends.append(self.send_telegram_notification(message, chat_id=chat_id, thread_id=thread_id))
+        await asyncio.gather(*sends)
+
+    async def send_telegram_notification(
+        self, message: str, retries: int = 3, chat_id: str | None = None, thread_id: int | None = None
+    ) -> bool:
+        chat_id = chat_id or self.chat_id
+        if not self.telegram_token or not chat_id:
+            logger.error("Telegram credentials not configured")
+            return False
+
+        url = f"{self.telegram_api_url}/bot{self.telegram_token}/sendMessage"
+        for part in split_message(message or "Empty message"):
+            payload = {"chat_id": chat_id, "text": part, "parse_mode": "HTML"}
+            if thread_id is not None:
+                payload["message_thread_id"] = thread_id
+            for _ in range(retries + 1):
+                try:
+                    started = time.perf_counter()
+                    async with self.session.post(url, json=payload) as resp:
+                        TELEGRAM_LATENCY.observe(time.perf_counter() - started)
+                        if resp.status == 429:
+                            RATE_LIMITED.labels("telegram").inc()
+                            answer = await resp.json()
+                            await asyncio.sleep(answer.get("parameters", {}).get("retry_after", 1))
+                            continue
+                        resp.raise_for_status()
+                        self.sent += 1
+                        break
+                except Exception as e:
+                    logger.error(f"Failed to send Telegram notification: {e}")
+                    ERRORS.labels("telegram").inc()
+                    return False
+            else:
+                # Все попытки получили 429 — часть не доставлена
+                logger.error("Telegram отвечал 429 все %d попытки, сообщение не отправлено", retries + 1)
+                ERRORS.labels("telegram").inc()
+                return False
+        return True
+
+    def stats(self) -> dict:
+        return {
+            "concurrency": self.concurrency,
+            "depth": len(self._tasks),
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "processed": self.processed,
+            "failed": self.failed,
+            "sent": self.sent,
+        }
+
+
+app = NotionEventApp.from_env()
+
+if __name__ == '__main__':
+    import uvicorn
+
+    port = int(os.getenv('PORT', 5000))
+    logger.info(f"Starting ASGI server on port {port}")
+    uvicorn.run(app, host="0.0.0.0", port=port)
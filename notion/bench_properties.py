@@ -0,0 +1,117 @@
+"""Микробенчмарк извлечения свойств: старая цепочка match против таблицы извлекателей,
+и поиск обновлённых свойств перебором против индекса по id.
+
+python bench_properties.py [кол-во свойств] [повторы]
+"""
+import sys
+import time
+import urllib.parse
+
+from properties import decode_property_ids, extract_page_values, index_properties
+
+TYPES = ["title", "rich_text", "number", "select", "status", "multi_select", "date", "checkbox",
+         "url", "email", "phone_number", "people", "files", "formula"]
+
+
+def make_property(i: int) -> dict:
+    prop_type = TYPES[i % len(TYPES)]
+    values = {
+        "title": [{"plain_text": f"title {i}"}],
+        "rich_text": [{"plain_text": "some"}, {"plain_text": " text"}],
+        "number": i * 1.5,
+        "select": {"name": f"option {i}"},
+        "status": {"name": "Активна"},
+        "multi_select": [{"name": "a"}, {"name": "b"}, {"name": "c"}],
+        "date": {"start": "2025-01-01", "end": None},
+        "checkbox": bool(i % 2),
+        "url": "https://example.com",
+        "email": "user@example.com",
+        "phone_number": "+10000000000",
+        "people": [{"name": "Ann"}, {"name": "Bob"}],
+        "files": [{"name": "report.pdf"}],
+        "formula": {"type": "number", "number": 1},
+    }
+    return {"id": f"p:{i}", "type": prop_type, prop_type: values[prop_type]}
+
+
+# Прежняя реализация Utils.extract_property_value — как точка отсчёта
+def legacy_extract(prop: dict):
+    match prop.get("type"):
+        case "title":
+            return "".join([t.get("plain_text", "") for t in prop.get("title", [])])
+        case "rich_text":
+            return "".join([t.get("plain_text", "") for t in prop.get("rich_text", [])])
+        case "number":
+            return prop.get("number")
+        case "select":
+            return prop.get("select", {}).get("name") if prop.get("select") else None
+        case "status":
+            return prop.get("status", {}).get("name") if prop.get("status") else None
+        case "multi_select":
+            return [opt.get("name") for opt in prop.get("multi_select", [])]
+        case "date":
+            return prop.get("date", {}).get("start") if prop.get("date") else None
+        case "checkbox":
+            return prop.get("checkbox")
+        case "url":
+            return prop.get("url")
+        case "email":
+            return prop.get("email")
+        case "phone_number":
+            return prop.get("phone_number")
+        case "people":
+            return [p.get("name", "") for p in prop.get("people", [])]
+        case "files":
+            return [f.get("name", "") for f in prop.get("files", [])]
+        case _:
+            return f"[{prop.get('type')}]"
+
+
+def legacy_lookup(properties: dict, updated: list) -> list:
+    found = []
+    for encoded_prop_id in updated:
+        prop_id = urllib.parse.unquote(encoded_prop_id)
+        for name, data in properties.items():
+            if data.get("id") == prop_id:
+                found.append(name)
+                break
+    return found
+
+
+def indexed_lookup(properties: dict, updated: list) -> list:
+    by_id = index_properties(properties)
+    return [by_id[prop_id][0] for prop_id in decode_property_ids(updated) if prop_id in by_id]
+
+
+def measure(fn, repeats: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - start) / repeats * 1e6
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 60
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+
+    properties = {f"Свойство {i}": make_property(i) for i in range(count)}
+    # Обновлены свойства из конца страницы — худший случай для перебора
+    updated = [urllib.parse.quote(prop["id"]) for prop in list(properties.values())[-count // 3:]]
+
+    legacy = {name: legacy_extract(prop) for name, prop in properties.items()}
+    assert legacy == extract_page_values(properties)
+    assert legacy_lookup(properties, updated) == indexed_lookup(properties, updated)
+
+    rows = [
+        ("extract: match", measure(lambda: {n: legacy_extract(p) for n, p in properties.items()}, repeats)),
+        ("extract: dispatch", measure(lambda: extract_page_values(properties), repeats)),
+        ("lookup: linear", measure(lambda: legacy_lookup(properties, updated), repeats)),
+        ("lookup: indexed", measure(lambda: indexed_lookup(properties, updated), repeats)),
+    ]
+    print(f"{count} свойств, обновлено {len(updated)}, {repeats} повторов")
+    for name, micros in rows:
+        print(f"{name:<18} {micros:8.2f} µs/страница")
+
+
+if __name__ == '__main__':
+    main()
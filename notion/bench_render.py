@@ -0,0 +1,91 @@
+"""Микробенчмарк рендера уведомлений о сделках: прежний построчный форматтер
+против скомпилированного шаблона из render.py.
+
+python bench_render.py [кол-во записей] [повторы]
+"""
+import sys
+import time
+from datetime import datetime
+
+from render import MessageTemplate
+
+STATUSES = ["Активна", "Закрыта", "Отменена"]
+
+
+def make_entry(i: int) -> dict:
+    return {
+        "Тикер": f"T{i % 300}",
+        "Статус": STATUSES[i % 3],
+        "Тип сделки": "Long" if i % 2 else "Short",
+        "Дата сделки": f"2025-{i % 12 + 1:02d}-{i % 28 + 1:02d}",
+        "Цена входа": 100 + i % 50,
+        "Цена выхода": None if i % 3 == 0 else 110 + i % 40,
+        "Объем": i % 17 + 1,
+        "Комиссии": 0.5,
+        "Комментарий": f"Позиция {i} по сигналу",
+        "id": f"21185b6b-d4cc-81e4-8c76-{i:012d}",
+    }
+
+
+# Прежняя реализация Utils.format_notion_telegram_message — как точка отсчёта
+def legacy_format(results, with_links=True):
+    messages = []
+    for entry in results:
+        lines = []
+        ticker = entry.get("Тикер", "Без тикера")
+        deal_type = entry.get("Тип сделки", "Сделка")
+        status = entry.get("Статус", "")
+        page_id = entry.get("id")
+        status_emoji = {"Активна": "🟢", "Закрыта": "🔴", "Отменена": "⚪"}.get(status, "⚙️")
+        deal_emoji = {"Long": "📈", "Short": "📉"}.get(deal_type, "💼")
+        header = f"{status_emoji} <b>{ticker}</b> — {deal_emoji} <i>{deal_type}</i> <code>{status}</code>"
+        if with_links and page_id:
+            header += f"\n🔗 <a href=\"https://www.notion.so/{page_id.replace('-', '')}\">Открыть в Notion</a>"
+        lines.append(header)
+        lines.append("")
+        for field, value in entry.items():
+            if field in ("Тикер", "Статус", "Тип сделки", "id"):
+                continue
+            if isinstance(value, str) and field == "Дата сделки":
+                try:
+                    value = datetime.fromisoformat(value.replace("Z", "+00:00")).strftime("%d.%m.%Y")
+                except Exception:
+                    pass
+            if value in (None, "", [], {}):
+                value = "—"
+            field_emoji = {
+                "Дата сделки": "🗓", "Цена входа": "💰", "Цена выхода": "🏁",
+                "Объем": "📦", "Комиссии": "💸", "Комментарий": "📝",
+            }.get(field, "•")
+            lines.append(f"{field_emoji} <b>{field}:</b> {value}")
+        messages.append("\n".join(lines))
+    return "\n\n".join(messages)
+
+
+def measure(fn, repeats: int) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    entries = [make_entry(i) for i in range(count)]
+    template = MessageTemplate()
+    # Без спецсимволов HTML вывод обоих вариантов должен совпадать байт в байт
+    assert legacy_format(entries) == template.render_batch(entries)
+
+    legacy = measure(lambda: legacy_format(entries), repeats)
+    compiled = measure(lambda: template.render_batch(entries), repeats)
+    print(f"{count} записей, лучшее из {repeats}")
+    print(f"legacy   {legacy:8.1f} ms  {legacy * 1000 / count:6.2f} µs/запись")
+    print(f"template {compiled:8.1f} ms  {compiled * 1000 / count:6.2f} µs/запись  x{legacy / compiled:.1f}")
+
+
+if __name__ == '__main__':
+    main()
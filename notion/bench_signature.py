@@ -0,0 +1,67 @@
+"""Микробенчмарк проверки X-Notion-Signature на типичных размерах событий.
+
+Базовая линия — hmac.new с hex-сравнением, как в старом verify_signature; дальше
+SignatureVerifier с одним и двумя (ротация) секретами; для масштаба — json.loads того же тела.
+
+python bench_signature.py [повторы]
+"""
+import hashlib
+import hmac
+import json
+import sys
+import time
+
+from signature import SignatureVerifier
+
+SECRET = "secret_current"
+OLD_SECRET = "secret_previous"
+
+
+def make_body(size: int) -> bytes:
+    event = {
+        "id": "0d1e2f3a-4b5c-6d7e-8f90-a1b2c3d4e5f6",
+        "timestamp": "2025-06-20T12:00:00.000Z",
+        "type": "database.content_updated",
+        "entity": {"id": "21185b6b-d4cc-816a-8ff6-d542fdaf02aa", "type": "database"},
+        "data": {"updated_blocks": []},
+    }
+    while len(json.dumps(event)) < size:
+        event["data"]["updated_blocks"].append({"id": "21185b6b-d4cc-81e4-8c76-c4b2b20a7a1b", "type": "block"})
+    return json.dumps(event).encode()
+
+
+def naive_verify(body: bytes, header: str) -> bool:
+    expected = "sha256=" + hmac.new(SECRET.encode(), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, header)
+
+
+def measure(fn, repeats: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - start) / repeats * 1e6
+
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    single = SignatureVerifier([SECRET])
+    rotating = SignatureVerifier([OLD_SECRET, SECRET])
+
+    print(f"{'тело':>8} {'hmac.new':>10} {'1 секрет':>10} {'2 секрета':>10} {'json.loads':>11}  (µs/запрос)")
+    for size in (512, 2048, 8192, 65536):
+        body = make_body(size)
+        header = "sha256=" + hmac.new(SECRET.encode(), body, hashlib.sha256).hexdigest()
+        assert naive_verify(body, header) and single.verify(body, header) and rotating.verify(body, header)
+        assert not single.verify(body + b" ", header)
+
+        print(
+            f"{len(body):>7}B "
+            f"{measure(lambda: naive_verify(body, header), repeats):>10.2f} "
+            f"{measure(lambda: single.verify(body, header), repeats):>10.2f} "
+            f"{measure(lambda: rotating.verify(body, header), repeats):>10.2f} "
+            f"{measure(lambda: json.loads(body), repeats):>11.2f}"
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterable
+
+
+def event_key(event: dict) -> str | None:
+    # У доставок Notion есть id события; без него — сущность + время + тип
+    if event.get("id"):
+        return event["id"]
+
+    entity_id = (event.get("entity") or {}).get("id")
+    timestamp = event.get("timestamp")
+    if entity_id and timestamp:
+        return f"{entity_id}:{timestamp}:{event.get('type')}"
+    return None
+
+
+class DedupIndex:
+    """Окно идемпотентности: повторная доставка того же события стоит одного поиска в словаре."""
+
+    def __init__(self, window: float = 3600.0, maxsize: int = 100_000):
+        self.window = window
+        self.maxsize = maxsize
+        # key -> monotonic время первой доставки, старые ключи в начале
+        self._seen: OrderedDict[str, float] = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.unique = 0
+        self.duplicates = 0
+
+    def check(self, event: dict) -> bool:
+        """True, если событие уже было в окне; иначе запоминает его."""
+        key = event_key(event)
+        if key is None:
+            return False
+
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            if key in self._seen:
+                self.duplicates += 1
+                return True
+
+            self._seen[key] = now
+            self.unique += 1
+            if len(self._seen) > self.maxsize:
+                self._seen.popitem(last=False)
+        return False
+
+    def forget(self, event: dict):
+        # Событие не приняли (503, ошибка) — повтор от Notion должен пройти
+        key = event_key(event)
+        with self._lock:
+            self._seen.pop(key, None)
+
+    def load(self, events: Iterable[tuple[float, dict]]):
+        """Восстанавливает окно после рестарта из пар (сколько секунд назад, событие)."""
+        now = time.monotonic()
+        with self._lock:
+            for age, event in events:
+                key = event_key(event)
+                if key is not None and age < self.window:
+                    self._seen[key] = now - age
+            self._seen = OrderedDict(sorted(self._seen.items(), key=lambda item: item[1]))
+
+    def _expire(self, now: float):
+        while self._seen:
+            key, seen_at = next(iter(self._seen.items()))
+            if now - seen_at < self.window:
+                return
+            self._seen.popitem(last=False)
+
+    def stats(self) -> dict:
+        return {"size": len(self._seen), "unique": self.unique, "duplicates": self.duplicates}
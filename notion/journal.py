@@ -0,0 +1,144 @@
+import json
+import logging
+import queue
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger('notion_webhook')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    offset INTEGER PRIMARY KEY AUTOINCREMENT,
+    received REAL NOT NULL,
+    payload TEXT NOT NULL,
+    processed INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS events_pending ON events(offset) WHERE processed = 0;
+"""
+
+
+class _Append:
+    __slots__ = ("payload", "done", "offset", "error")
+
+    def __init__(self, payload: str):
+        self.payload = payload
+        self.done = threading.Event()
+        self.offset: int | None = None
+        self.error: Exception | None = None
+
+
+class EventJournal:
+    """Журнал принятых событий вебхука в SQLite (WAL) с групповым коммитом.
+
+    append() возвращает управление только после fsync, но все append, пришедшие
+    пока пишется предыдущая пачка, уходят одной транзакцией и одним fsync.
+    """
+
+    def __init__(self, path: str = "events.db", batch_size: int = 256, retention: float = 24 * 3600):
+        self.path = path
+        self.batch_size = batch_size
+        self.retention = retention
+
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        # FULL в режиме WAL — fsync журнала на каждый COMMIT, т.е. на каждую пачку
+        self._db.execute("PRAGMA synchronous=FULL")
+        self._db.executescript(SCHEMA)
+
+        self._requests: queue.Queue = queue.Queue()
+        self._writer = threading.Thread(target=self._write_loop, name="event-journal", daemon=True)
+        self._writer.start()
+        self._last_prune = time.monotonic()
+
+        self.appended = 0
+        self.commits = 0
+
+    def append(self, payload: dict) -> int:
+        request = _Append(json.dumps(payload, ensure_ascii=False))
+        self._requests.put(request)
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return request.offset
+
+    def mark_processed(self, offsets: list[int]):
+        # Не ждём коммита: в худшем случае событие ещё раз проиграется после рестарта
+        if offsets:
+            self._requests.put(list(offsets))
+
+    def pending(self) -> list[tuple[int, dict]]:
+        rows = self._db.execute(
+            "SELECT offset, payload FROM events WHERE processed = 0 ORDER BY offset"
+        ).fetchall()
+        return [(offset, json.loads(payload)) for offset, payload in rows]
+
+    def recent(self, window: float) -> list[tuple[float, dict]]:
+        # (сколько секунд назад принято, событие) — для восстановления окна дедупликации
+        now = time.time()
+        rows = self._db.execute(
+            "SELECT received, payload FROM events WHERE received >= ? ORDER BY offset", (now - window,)
+        ).fetchall()
+        return [(now - received, json.loads(payload)) for received, payload in rows]
+
+    def close(self):
+        self._requests.put(None)
+        self._writer.join()
+        self._db.close()
+
+    def _write_loop(self):
+        while True:
+            batch = [self._requests.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._requests.get_nowait())
+                except queue.Empty:
+                    break
+
+            stop = None in batch
+            self._commit([item for item in batch if item is not None])
+            if stop:
+                return
+
+    def _commit(self, batch: list):
+        appends = [item for item in batch if isinstance(item, _Append)]
+        processed = [offset for item in batch if isinstance(item, list) for offset in item]
+
+        try:
+            self._db.execute("BEGIN")
+            now = time.time()
+            for item in appends:
+                cursor = self._db.execute(
+                    "INSERT INTO events (received, payload) VALUES (?, ?)", (now, item.payload)
+                )
+                item.offset = cursor.lastrowid
+            if processed:
+                self._db.executemany(
+                    "UPDATE events SET processed = 1 WHERE offset = ?", [(offset,) for offset in processed]
+                )
+            self._prune(now)
+            self._db.execute("COMMIT")
+            self.appended += len(appends)
+            self.commits += 1
+        except Exception as e:
+            logger.exception("Ошибка записи журнала событий")
+            if self._db.in_transaction:
+                self._db.execute("ROLLBACK")
+            for item in appends:
+                item.error = e
+        finally:
+            for item in appends:
+                item.done.set()
+
+    def _prune(self, now: float):
+        if time.monotonic() - self._last_prune < 60:
+            return
+        self._last_prune = time.monotonic()
+        self._db.execute("DELETE FROM events WHERE processed = 1 AND received < ?", (now - self.retention,))
+
+    def stats(self) -> dict:
+        return {
+            "appended": self.appended,
+            "commits": self.commits,
+            "events_per_commit": round(self.appended / self.commits, 2) if self.commits else 0,
+        }
@@ -0,0 +1,209 @@
+"""Нагрузочный тест /notion-webhook: waitress (run.py) против ASGI (asgi.py под uvicorn).
+
+Notion и Telegram подменяются локальными заглушками, поэтому меряется только сам сервер:
+events/s и p50/p99 времени ответа вебхука, а также p50/p99 от события до сообщения в Telegram.
+
+python loadtest.py [кол-во событий] [параллельность]
+"""
+import os
+import hmac
+import json
+import hashlib
+import re
+import sys
+import time
+import asyncio
+import statistics
+import subprocess
+import tempfile
+import uuid
+
+from aiohttp import ClientSession, web
+
+NOTION_PORT = 8281
+TELEGRAM_PORT = 8282
+SERVER_PORT = 8283
+
+TARGETS = {
+    "waitress": [sys.executable, "run.py"],
+    "uvicorn": [sys.executable, "-m", "uvicorn", "asgi:app", "--port", str(SERVER_PORT), "--log-level", "warning"],
+}
+
+WEBHOOK_TOKEN = "secret_loadtest"
+
+TICKER_RE = re.compile(r"<b>(ev\d+)</b>")
+
+
+class StandIns:
+    """Заглушки Notion (pages/blocks retrieve) и Telegram (sendMessage)."""
+
+    def __init__(self):
+        self.delivered: dict[str, float] = {}
+
+    def notion_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/v1/pages/{page_id}", self.page)
+        app.router.add_get("/v1/blocks/{block_id}", self.block)
+        return app
+
+    def telegram_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/bot{token}/sendMessage", self.send_message)
+        return app
+
+    async def page(self, request: web.Request) -> web.Response:
+        page_id = request.match_info["page_id"]
+        return web.json_response({
+            "object": "page",
+            "id": page_id,
+            "parent": {"type": "database_id", "database_id": "loadtest-db"},
+            "last_edited_time": "2025-01-01T00:00:00.000Z",
+            "properties": {
+                "Тикер": {"id": "title", "type": "title", "title": [{"plain_text": page_id}]},
+                "Статус": {"id": "st", "type": "select", "select": {"name": "Активна"}},
+                "Тип сделки": {"id": "tp", "type": "select", "select": {"name": "Long"}},
+                "Цена входа": {"id": "in", "type": "number", "number": 100.5},
+                "Объем": {"id": "vol", "type": "number", "number": 3},
+            },
+        })
+
+    async def block(self, request: web.Request) -> web.Response:
+        block_id = request.match_info["block_id"]
+        return web.json_response({
+            "object": "block",
+            "id": block_id,
+            "type": "child_page",
+            "parent": {"type": "database_id", "database_id": "loadtest-db"},
+        })
+
+    async def send_message(self, request: web.Request) -> web.Response:
+        data = await request.json()
+        now = time.perf_counter()
+        for ticker in TICKER_RE.findall(data.get("text", "")):
+            self.delivered.setdefault(ticker, now)
+        return web.json_response({"ok": True, "result": {"message_id": 1}})
+
+
+async def start_site(app: web.Application, port: int) -> web.AppRunner:
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+    return runner
+
+
+def make_event(run_id: str, i: int) -> dict:
+    # id уникален на прогон: иначе дедупликация сочтёт повтор теста повторной доставкой
+    return {
+        "id": f"event-{run_id}-{i}",
+        "type": "page.properties_updated",
+        "timestamp": "2025-01-01T00:00:00.000Z",
+        "entity": {"id": f"ev{i:06d}", "type": "page"},
+        "data": {"updated_properties": ["in"]},
+    }
+
+
+def percentile(values: list[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+async def wait_ready(session: ClientSession, url: str, timeout: float = 20.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            async with session.get(url) as resp:
+                if resp.status == 200:
+                    return
+        except OSError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError(f"Сервер {url} не поднялся за {timeout} с")
+
+
+def sign(body: bytes) -> str:
+    return "sha256=" + hmac.new(WEBHOOK_TOKEN.encode(), body, hashlib.sha256).hexdigest()
+
+
+async def run_target(name: str, stand_ins: StandIns, count: int, concurrency: int):
+    # Журнал и окно дедупликации — свои на каждый прогон, а не events.db рабочего каталога
+    workdir = tempfile.TemporaryDirectory(prefix=f"loadtest-{name}-")
+    run_id = uuid.uuid4().hex[:8]
+    env = dict(
+        os.environ,
+        PORT=str(SERVER_PORT),
+        NOTION_TOKEN="loadtest",
+        NOTION_API_URL=f"http://127.0.0.1:{NOTION_PORT}",
+        TELEGRAM_BOT_TOKEN="loadtest",
+        TELEGRAM_CHAT_ID="1",
+        TELEGRAM_API_URL=f"http://127.0.0.1:{TELEGRAM_PORT}",
+        # Лимиты боевых API здесь только мешают мерить сам сервер
+        NOTION_RATE_LIMIT="100000",
+        NOTION_DEBOUNCE_MS="0",
+        TELEGRAM_GLOBAL_RATE="100000",
+        TELEGRAM_CHAT_INTERVAL="0",
+        NOTION_WEBHOOK_TOKEN=WEBHOOK_TOKEN,
+        NOTION_JOURNAL_PATH=os.path.join(workdir.name, "events.db"),
+        NOTION_DEDUP_PERSIST="0",
+    )
+    process = subprocess.Popen(TARGETS[name], env=env, cwd=os.path.dirname(os.path.abspath(__file__)))
+    stand_ins.delivered.clear()
+
+    url = f"http://127.0.0.1:{SERVER_PORT}/notion-webhook"
+    sent_at: dict[str, float] = {}
+    latencies: list[float] = []
+    slots = asyncio.Semaphore(concurrency)
+
+    async def fire(session: ClientSession, i: int):
+        event = make_event(run_id, i)
+        async with slots:
+            started = time.perf_counter()
+            sent_at[event["entity"]["id"]] = started
+            body = json.dumps(event).encode()
+            headers = {"Content-Type": "application/json", "X-Notion-Signature": sign(body)}
+            async with session.post(url, data=body, headers=headers) as resp:
+                await resp.read()
+            latencies.append(time.perf_counter() - started)
+
+    try:
+        async with ClientSession() as session:
+            await wait_ready(session, url)
+            started = time.perf_counter()
+            await asyncio.gather(*(fire(session, i) for i in range(count)))
+            elapsed = time.perf_counter() - started
+
+            deadline = time.monotonic() + 30
+            while len(stand_ins.delivered) < count and time.monotonic() < deadline:
+                await asyncio.sleep(0.1)
+    finally:
+        process.terminate()
+        process.wait()
+        workdir.cleanup()
+
+    ack = [x * 1000 for x in latencies]
+    e2e = [(stand_ins.delivered[key] - sent_at[key]) * 1000 for key in stand_ins.delivered if key in sent_at]
+    print(
+        f"{name:<9} {count / elapsed:8.1f} ev/s  "
+        f"ack p50={statistics.median(ack):7.2f} ms p99={percentile(ack, 0.99):7.2f} ms  "
+        f"e2e p50={statistics.median(e2e) if e2e else float('nan'):7.2f} ms "
+        f"p99={percentile(e2e, 0.99) if e2e else float('nan'):7.2f} ms  "
+        f"delivered {len(e2e)}/{count}"
+    )
+
+
+async def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+
+    stand_ins = StandIns()
+    notion = await start_site(stand_ins.notion_app(), NOTION_PORT)
+    telegram = await start_site(stand_ins.telegram_app(), TELEGRAM_PORT)
+    try:
+        for name in TARGETS:
+            await run_target(name, stand_ins, count, concurrency)
+    finally:
+        await notion.cleanup()
+        await telegram.cleanup()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
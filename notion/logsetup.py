@@ -0,0 +1,132 @@
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+LOGGER_NAME = 'notion_webhook'
+
+# id события Notion, которое сейчас обрабатывается в этом потоке/задаче
+event_id: ContextVar[str | None] = ContextVar("event_id", default=None)
+
+# Служебные поля LogRecord — всё остальное из extra= уходит в JSON как есть
+_RECORD_FIELDS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "event_id"}
+
+
+class CorrelationFilter(logging.Filter):
+    # Фильтр висит на QueueHandler, т.е. выполняется в потоке запроса, где контекст ещё есть
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.event_id = event_id.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "event_id": getattr(record, "event_id", None),
+            "msg": record.getMessage(),
+        }
+        entry.update((key, value) for key, value in vars(record).items() if key not in _RECORD_FIELDS)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _TracebackQueueHandler(QueueHandler):
+    """QueueHandler.prepare() вклеивает трейсбек в msg и обнуляет exc_info до форматирования
+    в потоке слушателя. Здесь сообщение подставляется так же, а трейсбек уходит в exc_text —
+    JsonFormatter пишет его в поле "exc", TextFormatter дописывает после сообщения.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        if record.exc_info:
+            record.exc_text = record.exc_text or _traceback_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+_traceback_formatter = logging.Formatter()
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__('%(asctime)s - %(levelname)s - [%(event_id)s] %(message)s')
+
+    def format(self, record: logging.LogRecord) -> str:
+        if not hasattr(record, "event_id"):
+            record.event_id = None
+        return super().format(record)
+
+
+@contextmanager
+def bind_event(event: dict):
+    token = event_id.set(event.get("id"))
+    try:
+        yield
+    finally:
+        event_id.reset(token)
+
+
+class LazyJson:
+    """json.dumps откладывается до форматирования: при выключенном DEBUG не выполняется вовсе."""
+
+    __slots__ = ("payload",)
+
+    def __init__(self, payload):
+        self.payload = payload
+
+    def __str__(self) -> str:
+        return json.dumps(self.payload, ensure_ascii=False, indent=2)
+
+
+def log_payload(logger: logging.Logger, payload: dict, rate: float | None = None):
+    # Полные тела событий пишутся выборочно: доля LOG_PAYLOAD_SAMPLE от всех
+    if not logger.isEnabledFor(logging.DEBUG):
+        return
+    rate = float(os.getenv("LOG_PAYLOAD_SAMPLE", 0.01)) if rate is None else rate
+    if random.random() < rate:
+        logger.debug("Request data: %s", LazyJson(payload))
+
+
+def setup_logging(path: str = 'notion_webhook.log') -> logging.Logger:
+    """Логгер вебхука: запросы только кладут запись в очередь, файл пишет отдельный поток.
+
+    LOG_LEVEL — уровень (INFO), LOG_FORMAT — json или text, LOG_QUEUE=0 — писать синхронно.
+    """
+    logger = logging.getLogger(LOGGER_NAME)
+    if logger.handlers:
+        return logger
+    logger.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+    logger.propagate = False
+
+    handler = RotatingFileHandler(path, maxBytes=1024 * 1024, backupCount=3, encoding="utf-8")
+    handler.setFormatter(JsonFormatter() if os.getenv("LOG_FORMAT", "json") == "json" else TextFormatter())
+
+    if os.getenv("LOG_QUEUE", "1") != "1":
+        handler.addFilter(CorrelationFilter())
+        logger.addHandler(handler)
+        return logger
+
+    records: queue.SimpleQueue = queue.SimpleQueue()
+    queue_handler = _TracebackQueueHandler(records)
+    queue_handler.addFilter(CorrelationFilter())
+    listener = QueueListener(records, handler, respect_handler_level=True)
+    listener.start()
+    # Очередь дописывается в файл при остановке процесса
+    atexit.register(listener.stop)
+    logger.addHandler(queue_handler)
+    return logger
@@ -0,0 +1,66 @@
+import re
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Callable
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+
+# Внешние API отвечают за десятки миллисекунд — секунды, сетка с запасом под 429 и ретраи
+API_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+WEBHOOK_LATENCY = Histogram(
+    "notion_webhook_request_seconds", "Время ответа /notion-webhook", ["method", "status"],
+)
+EVENT_LATENCY = Histogram(
+    "notion_event_processing_seconds", "Обработка события от очереди до отправки уведомления",
+    buckets=API_BUCKETS,
+)
+EVENTS = Counter("notion_events_total", "События вебхука по результату", ["result"])
+FILTERED = Counter("notion_events_filtered_total", "События, отсеянные до обработки", ["reason"])
+NOTION_LATENCY = Histogram(
+    "notion_api_request_seconds", "Запросы к Notion API", ["method"], buckets=API_BUCKETS,
+)
+TELEGRAM_LATENCY = Histogram(
+    "telegram_send_seconds", "Запросы sendMessage к Telegram", buckets=API_BUCKETS,
+)
+RATE_LIMITED = Counter("rate_limited_total", "Ответы 429 от внешних API", ["api"])
+ERRORS = Counter("errors_total", "Ошибки по месту возникновения", ["stage"])
+QUEUE_DEPTH = Gauge("queue_depth", "Глубина внутренних очередей", ["queue"])
+QUEUE_AGE = Gauge("queue_oldest_age_seconds", "Возраст самого старого события в очереди", ["queue"])
+
+
+@lru_cache(maxsize=64)
+def _endpoint_label(qualname: str) -> str:
+    resource, _, method = qualname.rpartition(".")
+    parts = [part.lower() for part in re.findall(r"[A-Z][a-z]*", resource.removesuffix("Endpoint"))]
+    return ".".join([*parts, method]) if parts else method
+
+
+def method_name(fn: Callable) -> str:
+    # notion.pages.retrieve (PagesEndpoint.retrieve) -> "pages.retrieve", как метки в webhook.py и боте;
+    # вызываемый эндпоинт notion.search — объект без __qualname__ -> "search"
+    qualname = getattr(fn, "__qualname__", None)
+    if qualname is None:
+        return type(fn).__name__.removesuffix("Endpoint").lower() or "unknown"
+    return _endpoint_label(qualname)
+
+
+@contextmanager
+def observe(histogram, *labels):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        (histogram.labels(*labels) if labels else histogram).observe(time.perf_counter() - start)
+
+
+def track_queue(name: str, depth: Callable[[], float], oldest_age: Callable[[], float] | None = None):
+    # Гейджи считаются только в момент запроса /metrics, горячий путь их не трогает
+    QUEUE_DEPTH.labels(name).set_function(depth)
+    if oldest_age is not None:
+        QUEUE_AGE.labels(name).set_function(oldest_age)
+
+
+def render() -> tuple[bytes, str]:
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -0,0 +1,198 @@
+import os
+import json
+import logging
+import sqlite3
+import threading
+
+from typing import Callable, Dict, List
+
+from properties import extract_page_values
+
+logger = logging.getLogger('notion_webhook')
+
+# Свойство базы сделок -> колонка локальной таблицы
+FIELD_COLUMNS = {
+    "Тикер": "ticker",
+    "Статус": "status",
+    "Тип сделки": "deal_type",
+    "Дата сделки": "deal_date",
+    "Цена входа": "entry_price",
+    "Цена выхода": "exit_price",
+    "Объем": "volume",
+    "Комиссии": "fees",
+    "Комментарий": "comment",
+}
+
+# REAL-колонки: formula/rollup дают строку вроде "[formula]", такое пишем как NULL
+NUMERIC_COLUMNS = frozenset(("entry_price", "exit_price", "volume", "fees"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS trades (
+    page_id TEXT PRIMARY KEY,
+    database_id TEXT NOT NULL,
+    ticker TEXT,
+    status TEXT,
+    deal_type TEXT,
+    deal_date TEXT,
+    entry_price REAL,
+    exit_price REAL,
+    volume REAL,
+    fees REAL,
+    comment TEXT,
+    properties TEXT NOT NULL,
+    last_edited_time TEXT,
+    archived INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS trades_ticker ON trades(ticker);
+CREATE INDEX IF NOT EXISTS trades_status ON trades(status);
+CREATE INDEX IF NOT EXISTS trades_deal_date ON trades(deal_date);
+CREATE TABLE IF NOT EXISTS sync_state (
+    database_id TEXT PRIMARY KEY,
+    last_edited_time TEXT
+);
+"""
+
+
+def normalize_id(notion_id: str | None) -> str:
+    return (notion_id or "").replace("-", "")
+
+
+def column_value(column: str, value):
+    if column in NUMERIC_COLUMNS:
+        return value if isinstance(value, (int, float)) and not isinstance(value, bool) else None
+    return value
+
+
+class TradesMirror:
+    """Локальная копия базы сделок в SQLite.
+
+    Заполняется постраничным databases.query, дальше обновляется из событий вебхука
+    и периодическим запросом изменений по last_edited_time.
+    """
+
+    def __init__(self, path: str, database_id: str, query: Callable[..., dict]):
+        self.path = path
+        self.database_id = database_id
+        self.query = query
+
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(SCHEMA)
+        # Строки, записанные до проверки типов: текст в REAL-колонках ломал /stats и /pnl
+        with self._db:
+            for column in sorted(NUMERIC_COLUMNS):
+                self._db.execute(f"UPDATE trades SET {column} = NULL WHERE typeof({column}) = 'text'")
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def owns(self, page: dict) -> bool:
+        parent = page.get("parent", {})
+        return parent.get("type") == "database_id" and normalize_id(parent.get("database_id")) == normalize_id(self.database_id)
+
+    def upsert_pages(self, pages: List[dict], advance_cursor: bool = False):
+        rows = []
+        for page in pages:
+            values = extract_page_values(page.get("properties", {}))
+            row = {column: column_value(column, values.get(field)) for field, column in FIELD_COLUMNS.items()}
+            row.update(
+                page_id=page["id"],
+                database_id=self.database_id,
+                properties=json.dumps(values, ensure_ascii=False),
+                last_edited_time=page.get("last_edited_time"),
+                archived=int(bool(page.get("archived") or page.get("in_trash"))),
+            )
+            rows.append(row)
+
+        if not rows:
+            return
+
+        columns = list(rows[0])
+        updates = ", ".join(f"{column} = excluded.{column}" for column in columns if column != "page_id")
+        sql = (
+            f"INSERT INTO trades ({', '.join(columns)}) VALUES ({', '.join(':' + c for c in columns)}) "
+            f"ON CONFLICT(page_id) DO UPDATE SET {updates}"
+        )
+        latest = max((row["last_edited_time"] or "" for row in rows), default="")
+        with self._lock, self._db:
+            self._db.executemany(sql, rows)
+            # Курсор двигает только синхронизация: вебхук мог прийти раньше пропущенных правок
+            if advance_cursor and latest:
+                self._db.execute(
+                    "INSERT INTO sync_state (database_id, last_edited_time) VALUES (?, ?) "
+                    "ON CONFLICT(database_id) DO UPDATE SET last_edited_time = "
+                    "max(last_edited_time, excluded.last_edited_time)",
+                    (self.database_id, latest),
+                )
+
+    def upsert_page(self, page: dict):
+        if self.owns(page):
+            self.upsert_pages([page])
+
+    def mark_archived(self, page_id: str):
+        with self._lock, self._db:
+            self._db.execute("UPDATE trades SET archived = 1 WHERE page_id = ?", (page_id,))
+
+    def state(self, page_id: str) -> tuple[Dict, str | None] | None:
+        # Значения и last_edited_time строки — «прежнее состояние» для уведомлений о разнице
+        with self._lock:
+            row = self._db.execute(
+                "SELECT properties, last_edited_time FROM trades WHERE page_id = ? AND archived = 0", (page_id,)
+            ).fetchone()
+        return (json.loads(row[0]), row[1]) if row else None
+
+    def cursor(self) -> str | None:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT last_edited_time FROM sync_state WHERE database_id = ?", (self.database_id,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def sync(self, since: str | None = None) -> int:
+        """Полная выгрузка (since=None) или только изменённые с since страницы."""
+        params = {"database_id": self.database_id, "page_size": 100}
+        if since:
+            params["filter"] = {"timestamp": "last_edited_time", "last_edited_time": {"on_or_after": since}}
+
+        total = 0
+        while True:
+            response = self.query(**params)
+            results = response.get("results", [])
+            self.upsert_pages(results, advance_cursor=True)
+            total += len(results)
+            if not response.get("has_more"):
+                return total
+            params["start_cursor"] = response.get("next_cursor")
+
+    def start(self, interval: float = 300.0):
+        self._thread = threading.Thread(target=self._run, args=(interval,), name="trades-mirror", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self, interval: float):
+        while not self._stop.is_set():
+            try:
+                since = self.cursor()
+                count = self.sync(since)
+                logger.info(f"🪞 Синхронизация зеркала сделок ({'дельта' if since else 'полная'}): {count} стр.")
+            except Exception as e:
+                logger.warning(f"⚠️ Не удалось синхронизировать зеркало сделок: {e}")
+            self._stop.wait(interval)
+
+
+if __name__ == '__main__':
+    from dotenv import load_dotenv
+    from notion_client import Client
+
+    load_dotenv()
+    client = Client(auth=os.getenv("NOTION_TOKEN"))
+    mirror = TradesMirror(
+        os.getenv("TRADES_DB_PATH", "trades.db"),
+        os.environ["TRADES_DATABASE_ID"],
+        client.databases.query,
+    )
+    print(f"Загружено страниц: {mirror.sync()}")
@@ -0,0 +1,82 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Callable
+
+
+def parse_timestamp(value: str | None) -> datetime | None:
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+
+
+class PageCache:
+    """Короткоживущий кэш страниц Notion по id.
+
+    Страница берётся из кэша, только если она получена после события (timestamp из payload)
+    и не старше ttl, поэтому одно событие и пачка событий по одной странице дают один pages.retrieve.
+    """
+
+    def __init__(self, fetch: Callable[[str], dict], ttl: float = 5.0, maxsize: int = 512):
+        self.fetch = fetch
+        self.ttl = ttl
+        self.maxsize = maxsize
+
+        # page_id -> (время получения UTC, monotonic, страница)
+        self._data: OrderedDict[str, tuple[datetime, float, dict]] = OrderedDict()
+        self._fetch_locks: dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def _lookup(self, page_id: str, event_time: datetime | None) -> dict | None:
+        entry = self._data.get(page_id)
+        if entry is None:
+            return None
+
+        fetched_at, fetched_mono, page = entry
+        if time.monotonic() - fetched_mono > self.ttl:
+            return None
+        if event_time is not None and fetched_at < event_time:
+            return None
+
+        self._data.move_to_end(page_id)
+        return page
+
+    def get(self, page_id: str, event_time: datetime | None = None) -> dict:
+        with self._lock:
+            page = self._lookup(page_id, event_time)
+            if page is not None:
+                self.hits += 1
+                return page
+            fetch_lock = self._fetch_locks.setdefault(page_id, threading.Lock())
+
+        # Параллельные воркеры по одной странице ждут один запрос
+        with fetch_lock:
+            with self._lock:
+                page = self._lookup(page_id, event_time)
+                if page is not None:
+                    self.hits += 1
+                    return page
+                self.misses += 1
+
+            fetched_at = datetime.now(timezone.utc)
+            page = self.fetch(page_id)
+            self.put(page_id, page, fetched_at)
+            return page
+
+    def put(self, page_id: str, page: dict, fetched_at: datetime | None = None):
+        with self._lock:
+            self._data[page_id] = (fetched_at or datetime.now(timezone.utc), time.monotonic(), page)
+            self._data.move_to_end(page_id)
+            while len(self._data) > self.maxsize:
+                evicted, _ = self._data.popitem(last=False)
+                self._fetch_locks.pop(evicted, None)
+
+    def stats(self) -> dict:
+        return {"size": len(self._data), "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,215 @@
+import logging
+import queue
+import threading
+import time
+from typing import Callable
+
+logger = logging.getLogger('notion_webhook')
+
+# При склейке событий по одной сущности побеждает более «сильный» тип
+EVENT_PRIORITY = {
+    "page.deleted": 5,
+    "page.created": 4,
+    "page.properties_updated": 3,
+    "page.content_updated": 2,
+}
+
+# Удаление и восстановление отменяют друг друга: из такой пары важно только последнее
+LIFECYCLE_EVENTS = frozenset(("page.deleted", "page.undeleted"))
+
+
+def _union(first: list, second: list) -> list:
+    seen = set()
+    merged = []
+    for item in first + second:
+        key = item.get("id") if isinstance(item, dict) else item
+        if key not in seen:
+            seen.add(key)
+            merged.append(item)
+    return merged
+
+
+def _lifecycle_at(event: dict) -> str:
+    # timestamp склеенного события — максимум по всем, поэтому время удаления/восстановления хранится отдельно
+    return event.get("_lifecycle_at") or event.get("timestamp") or ""
+
+
+def merge_events(current: dict, new: dict) -> dict:
+    if {current.get("type"), new.get("type")} == LIFECYCLE_EVENTS:
+        # Удаление с отменой в окне debounce не должно убрать сделку из зеркала; при равных timestamp — порядок прихода
+        merged = dict(new if _lifecycle_at(new) >= _lifecycle_at(current) else current)
+    elif EVENT_PRIORITY.get(new.get("type"), 0) > EVENT_PRIORITY.get(current.get("type"), 0):
+        merged = dict(new)
+    else:
+        merged = dict(current)
+    if merged.get("type") in LIFECYCLE_EVENTS:
+        merged["_lifecycle_at"] = _lifecycle_at(merged)
+
+    current_data = current.get("data") or {}
+    new_data = new.get("data") or {}
+    data = dict(merged.get("data") or {})
+    for key in ("updated_properties", "updated_blocks"):
+        items = _union(current_data.get(key, []), new_data.get(key, []))
+        if items:
+            data[key] = items
+    merged["data"] = data
+
+    # Смещения в журнале событий: после обработки отмечаются все склеенные события
+    offsets = _union(current.get("_offsets", []), new.get("_offsets", []))
+    if offsets:
+        merged["_offsets"] = offsets
+
+    # Timestamp ISO-8601 в UTC, строки сравниваются как даты
+    merged["timestamp"] = max(current.get("timestamp") or "", new.get("timestamp") or "")
+    return merged
+
+
+class EventPipeline:
+    """Ограниченная очередь событий вебхука и пул воркеров: Notion и Telegram вызываются вне запроса.
+
+    События по одной сущности, пришедшие в пределах debounce-окна, склеиваются в одно.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[dict], object],
+        workers: int = 4,
+        maxsize: int = 1000,
+        debounce: float = 0.0,
+    ):
+        self.handler = handler
+        self.workers = workers
+        self.maxsize = maxsize
+        self.debounce = debounce
+        self.queue: queue.Queue = queue.Queue(maxsize)
+        self._threads: list[threading.Thread] = []
+        self._lock = threading.Lock()
+
+        # entity_id -> (дедлайн, время первого события, склеенное событие)
+        self._pending: dict[str, tuple[float, float, dict]] = {}
+        self._pending_changed = threading.Condition(self._lock)
+        self._stopping = False
+
+        self.accepted = 0
+        self.coalesced = 0
+        self.rejected = 0
+        self.processed = 0
+        self.failed = 0
+
+    def start(self):
+        self._stopping = False
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"notion-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+        if self.debounce > 0:
+            self._dispatcher = threading.Thread(target=self._dispatch, name="notion-debounce", daemon=True)
+            self._dispatcher.start()
+
+    def stop(self, timeout: float = 10.0):
+        # Отложенные события сразу уходят в очередь, воркеры дорабатывают её и выходят на None
+        if self.debounce > 0:
+            with self._lock:
+                self._stopping = True
+                self._pending_changed.notify()
+            self._dispatcher.join(timeout)
+
+        for _ in self._threads:
+            self.queue.put(None)
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads.clear()
+
+    def submit(self, event: dict) -> bool:
+        key = (event.get("entity") or {}).get("id")
+        if self.debounce <= 0 or not key:
+            return self._enqueue(time.monotonic(), event)
+
+        with self._lock:
+            pending = self._pending.get(key)
+            if pending is not None:
+                deadline, first_seen, merged = pending
+                self._pending[key] = (deadline, first_seen, merge_events(merged, event))
+                self.accepted += 1
+                self.coalesced += 1
+                return True
+
+            if len(self._pending) + self.queue.qsize() >= self.maxsize:
+                self.rejected += 1
+                return False
+
+            now = time.monotonic()
+            # Окно фиксируется от первого события: задержка не растёт от потока правок
+            self._pending[key] = (now + self.debounce, now, event)
+            self.accepted += 1
+            self._pending_changed.notify()
+        return True
+
+    def _enqueue(self, first_seen: float, event: dict) -> bool:
+        try:
+            self.queue.put_nowait((first_seen, event))
+        except queue.Full:
+            with self._lock:
+                self.rejected += 1
+            return False
+
+        with self._lock:
+            self.accepted += 1
+        return True
+
+    def _dispatch(self):
+        while True:
+            with self._lock:
+                while True:
+                    now = time.monotonic()
+                    due = [key for key, (deadline, _, _) in self._pending.items()
+                           if deadline <= now or self._stopping]
+                    if due:
+                        break
+                    if self._stopping:
+                        return
+                    timeout = min((deadline for deadline, _, _ in self._pending.values()), default=None)
+                    self._pending_changed.wait(None if timeout is None else timeout - now)
+                ready = [self._pending.pop(key) for key in due]
+
+            for _, first_seen, event in ready:
+                self.queue.put((first_seen, event))
+
+    def _worker(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                self.queue.task_done()
+                return
+
+            _, event = item
+            try:
+                self.handler(event)
+                with self._lock:
+                    self.processed += 1
+            except Exception:
+                logger.exception("Ошибка обработки события в воркере")
+                with self._lock:
+                    self.failed += 1
+            finally:
+                self.queue.task_done()
+
+    def oldest_age(self) -> float:
+        with self.queue.mutex:
+            if not self.queue.queue or self.queue.queue[0] is None:
+                return 0.0
+            return time.monotonic() - self.queue.queue[0][0]
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "depth": self.queue.qsize(),
+            "pending": len(self._pending),
+            "oldest_age": round(self.oldest_age(), 3),
+            "accepted": self.accepted,
+            "coalesced": self.coalesced,
+            "rejected": self.rejected,
+            "processed": self.processed,
+            "failed": self.failed,
+        }
@@ -0,0 +1,130 @@
+import threading
+import time
+import urllib.parse
+from typing import Any, Callable, Dict, Iterable, List, Tuple
+
+
+def _plain_text(items: list) -> str:
+    return "".join(t.get("plain_text", "") for t in items or [])
+
+
+# Тип свойства Notion -> значение в Python (для форматтера и зеркала)
+EXTRACTORS: Dict[str, Callable[[dict], Any]] = {
+    "title": lambda prop: _plain_text(prop.get("title")),
+    "rich_text": lambda prop: _plain_text(prop.get("rich_text")),
+    "number": lambda prop: prop.get("number"),
+    "select": lambda prop: (prop.get("select") or {}).get("name"),
+    "status": lambda prop: (prop.get("status") or {}).get("name"),
+    "multi_select": lambda prop: [opt.get("name") for opt in prop.get("multi_select") or []],
+    "date": lambda prop: (prop.get("date") or {}).get("start"),
+    "checkbox": lambda prop: prop.get("checkbox"),
+    "url": lambda prop: prop.get("url"),
+    "email": lambda prop: prop.get("email"),
+    "phone_number": lambda prop: prop.get("phone_number"),
+    "people": lambda prop: [p.get("name", "") for p in prop.get("people") or []],
+    "files": lambda prop: [f.get("name", "") for f in prop.get("files") or []],
+}
+
+
+def _display_date(prop: dict) -> str:
+    date = prop.get("date") or {}
+    start, end = date.get("start") or "", date.get("end")
+    return f"{start} → {end}" if end else start
+
+
+def _display_list(value: list) -> str:
+    return ", ".join(str(item) for item in value)
+
+
+# Тип свойства -> строка для текстовых уведомлений webhook.py
+DISPLAY: Dict[str, Callable[[dict], str]] = {
+    "number": lambda prop: "" if prop.get("number") is None else str(prop.get("number")),
+    "checkbox": lambda prop: "☑" if prop.get("checkbox") else "☐",
+    "date": _display_date,
+    "multi_select": lambda prop: _display_list(EXTRACTORS["multi_select"](prop)),
+    "people": lambda prop: _display_list(EXTRACTORS["people"](prop)),
+    "files": lambda prop: _display_list(EXTRACTORS["files"](prop)),
+}
+
+
+def extract_property_value(prop: dict):
+    extractor = EXTRACTORS.get(prop.get("type"))
+    if extractor is None:
+        return f"[{prop.get('type')}]"
+    return extractor(prop)
+
+
+def display_property_value(prop: dict) -> str:
+    if not prop:
+        return ""
+    prop_type = prop.get("type")
+    if not prop_type:
+        return "[unknown type]"
+
+    display = DISPLAY.get(prop_type)
+    if display is not None:
+        return display(prop)
+    value = extract_property_value(prop)
+    return "" if value is None else str(value)
+
+
+def extract_page_values(properties: dict) -> dict:
+    return {field: extract_property_value(prop) for field, prop in properties.items()}
+
+
+def index_properties(properties: dict) -> Dict[str, Tuple[str, dict]]:
+    """id свойства -> (имя, свойство): поиск обновлённых свойств за O(1)."""
+    return {prop.get("id"): (name, prop) for name, prop in properties.items()}
+
+
+def decode_property_ids(ids: Iterable[str]) -> List[str]:
+    # В updated_properties id приходят URL-кодированными
+    return [urllib.parse.unquote(prop_id) for prop_id in ids]
+
+
+class SchemaUnavailable(LookupError):
+    """Схема недавно не загрузилась — повторный запрос откладывается до истечения failure_ttl."""
+
+
+class SchemaCache:
+    """Схема баз Notion: id свойства -> (имя, тип). Сбрасывается по database.schema_updated.
+
+    Неудачная загрузка тоже запоминается на failure_ttl секунд, чтобы недоступная
+    база не стоила лишнего запроса к Notion на каждое событие.
+    """
+
+    def __init__(self, retrieve_database: Callable[[str], dict], failure_ttl: float = 300.0):
+        self.retrieve_database = retrieve_database
+        self.failure_ttl = failure_ttl
+        self._schemas: Dict[str, Dict[str, Tuple[str, str]]] = {}
+        self._failed: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def get(self, database_id: str) -> Dict[str, Tuple[str, str]]:
+        with self._lock:
+            schema = self._schemas.get(database_id)
+            retry_at = self._failed.get(database_id)
+        if schema is not None:
+            return schema
+        if retry_at is not None and time.monotonic() < retry_at:
+            raise SchemaUnavailable(database_id)
+
+        try:
+            database = self.retrieve_database(database_id)
+        except Exception:
+            with self._lock:
+                self._failed[database_id] = time.monotonic() + self.failure_ttl
+            raise
+        schema = {
+            prop.get("id"): (name, prop.get("type"))
+            for name, prop in database.get("properties", {}).items()
+        }
+        with self._lock:
+            self._schemas[database_id] = schema
+            self._failed.pop(database_id, None)
+        return schema
+
+    def invalidate(self, database_id: str):
+        with self._lock:
+            self._schemas.pop(database_id, None)
+            self._failed.pop(database_id, None)
@@ -0,0 +1,108 @@
+import asyncio
+import logging
+import threading
+import time
+from typing import Awaitable, Callable, TypeVar
+
+from notion_client import APIResponseError
+
+from metrics import NOTION_LATENCY, RATE_LIMITED, method_name, observe
+
+logger = logging.getLogger('notion_webhook')
+
+T = TypeVar("T")
+
+
+class TokenBucket:
+    """Потокобезопасный token bucket; у Notion в среднем ~3 запроса в секунду на интеграцию."""
+
+    def __init__(self, rate: float = 3.0, capacity: float = 3.0):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+
+                if now >= self._blocked_until and self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+
+                wait = max(self._blocked_until - now, (1 - self._tokens) / self.rate)
+            time.sleep(wait)
+
+    def pause(self, seconds: float):
+        # Retry-After из 429 останавливает всех, кто берёт токены из этого ведра
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+            self._tokens = 0
+
+
+def call_with_retry(bucket: TokenBucket, fn: Callable[..., T], *args, retries: int = 3, **kwargs) -> T:
+    method = method_name(fn)
+    for attempt in range(retries + 1):
+        bucket.acquire()
+        try:
+            with observe(NOTION_LATENCY, method):
+                return fn(*args, **kwargs)
+        except APIResponseError as e:
+            if e.status != 429 or attempt == retries:
+                raise
+            RATE_LIMITED.labels("notion").inc()
+            retry_after = float(e.headers.get("Retry-After", 1))
+            logger.warning("⏳ Notion 429, пауза %.1f с (попытка %d)", retry_after, attempt + 1)
+            bucket.pause(retry_after)
+
+
+class AsyncTokenBucket:
+    """То же ведро для одного event loop: ожидающие встают в очередь на asyncio.Lock."""
+
+    def __init__(self, rate: float = 3.0, capacity: float = 3.0):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+
+                if now >= self._blocked_until and self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+
+                await asyncio.sleep(max(self._blocked_until - now, (1 - self._tokens) / self.rate))
+
+    def pause(self, seconds: float):
+        self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+        self._tokens = 0
+
+
+async def call_with_retry_async(
+    bucket: AsyncTokenBucket, fn: Callable[..., Awaitable[T]], *args, retries: int = 3, **kwargs
+) -> T:
+    method = method_name(fn)
+    for attempt in range(retries + 1):
+        await bucket.acquire()
+        try:
+            with observe(NOTION_LATENCY, method):
+                return await fn(*args, **kwargs)
+        except APIResponseError as e:
+            if e.status != 429 or attempt == retries:
+                raise
+            RATE_LIMITED.labels("notion").inc()
+            retry_after = float(e.headers.get("Retry-After", 1))
+            logger.warning("⏳ Notion 429, пауза %.1f с (попытка %d)", retry_after, attempt + 1)
+            bucket.pause(retry_after)
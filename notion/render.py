@@ -0,0 +1,141 @@
+from datetime import datetime
+from functools import lru_cache
+from html import escape
+from typing import Callable, Dict, Iterable, List, Tuple
+
+EMPTY_MESSAGE = "⚠️ Обновление получено, но данные страницы не были извлечены."
+
+STATUS_EMOJI = {
+    "Активна": "🟢",
+    "Закрыта": "🔴",
+    "Отменена": "⚪",
+}
+
+DEAL_EMOJI = {
+    "Long": "📈",
+    "Short": "📉",
+}
+
+FIELD_EMOJI = {
+    "Статус": "🚦",
+    "Тип сделки": "🔀",
+    "Тикер": "🏷",
+    "Дата сделки": "🗓",
+    "Цена входа": "💰",
+    "Цена выхода": "🏁",
+    "Объем": "📦",
+    "Комиссии": "💸",
+    "Комментарий": "📝",
+}
+
+# Поля, которые уходят в заголовок и не повторяются в теле сообщения
+HEADER_FIELDS = frozenset(("Тикер", "Статус", "Тип сделки", "id"))
+
+Formatter = Callable[[object], str]
+
+
+def format_value(value) -> str:
+    if value in (None, "", [], {}):
+        return "—"
+    return escape(str(value), quote=False)
+
+
+@lru_cache(maxsize=4096)
+def _format_date(value: str) -> str:
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).strftime("%d.%m.%Y")
+    except ValueError:
+        return escape(value, quote=False)
+
+
+def format_date(value) -> str:
+    # Дат в пачке немного, а разбор ISO дорогой — результат кэшируется
+    if isinstance(value, str) and value:
+        return _format_date(value)
+    return format_value(value)
+
+
+FIELD_FORMATTERS: Dict[str, Formatter] = {
+    "Дата сделки": format_date,
+}
+
+
+class MessageTemplate:
+    """Шаблон HTML-сообщения о сделках, компилируемый один раз на набор полей.
+
+    Для каждого порядка полей (схема базы) заранее собираются префиксы строк
+    с эмодзи и экранированным именем поля и их форматтеры; render() только
+    подставляет экранированные значения и склеивает строки одним join.
+    """
+
+    def __init__(self, with_links: bool = True):
+        self.with_links = with_links
+        self._compiled: Dict[Tuple[str, ...], List[Tuple[str, str, Formatter]]] = {}
+
+    def compile(self, fields: Tuple[str, ...]) -> List[Tuple[str, str, Formatter]]:
+        compiled = self._compiled.get(fields)
+        if compiled is None:
+            compiled = [
+                (field, f"{FIELD_EMOJI.get(field, '•')} <b>{escape(field, quote=False)}:</b> ",
+                 FIELD_FORMATTERS.get(field, format_value))
+                for field in fields if field not in HEADER_FIELDS
+            ]
+            self._compiled[fields] = compiled
+        return compiled
+
+    def header(self, entry: dict) -> str:
+        ticker = entry.get("Тикер", "Без тикера")
+        deal_type = entry.get("Тип сделки", "Сделка")
+        status = entry.get("Статус", "")
+
+        header = (
+            f"{STATUS_EMOJI.get(status, '⚙️')} <b>{escape(str(ticker), quote=False)}</b> — "
+            f"{DEAL_EMOJI.get(deal_type, '💼')} <i>{escape(str(deal_type), quote=False)}</i> "
+            f"<code>{escape(str(status), quote=False)}</code>"
+        )
+
+        page_id = entry.get("id")
+        if self.with_links and page_id:
+            url = f"https://www.notion.so/{page_id.replace('-', '')}"
+            header += f"\n🔗 <a href=\"{escape(url)}\">Открыть в Notion</a>"
+        return header
+
+    def render(self, entry: dict) -> str:
+        parts = [self.header(entry), ""]
+        for field, prefix, formatter in self.compile(tuple(entry)):
+            parts.append(prefix + formatter(entry[field]))
+        return "\n".join(parts)
+
+    def render_diff(self, entry: dict, changes: dict) -> str:
+        # Только изменившиеся поля в порядке схемы: «было → стало»
+        parts = [self.header(entry), ""]
+        # Поля заголовка (закрытие сделки — смена Статуса) в заголовке видны только новыми
+        for field in entry:
+            if field in HEADER_FIELDS and field != "id" and field in changes:
+                old, new = changes[field]
+                parts.append(
+                    f"{FIELD_EMOJI.get(field, '•')} <b>{escape(field, quote=False)}:</b> "
+                    f"{format_value(old)} → {format_value(new)}"
+                )
+        for field, prefix, formatter in self.compile(tuple(entry)):
+            if field in changes:
+                old, new = changes[field]
+                parts.append(f"{prefix}{formatter(old)} → {formatter(new)}")
+        return "\n".join(parts)
+
+    def render_batch(self, entries: Iterable[dict], changes: Iterable[dict | None] | None = None) -> str:
+        if changes is None:
+            rendered = [self.render(entry) for entry in entries]
+        else:
+            rendered = [
+                self.render(entry) if diff is None else self.render_diff(entry, diff)
+                for entry, diff in zip(entries, changes)
+            ]
+        return "\n\n".join(rendered) if rendered else EMPTY_MESSAGE
+
+
+_templates = {True: MessageTemplate(with_links=True), False: MessageTemplate(with_links=False)}
+
+
+def render_trades(results: List[dict], with_links: bool = True, changes: List[dict | None] | None = None) -> str:
+    return _templates[bool(with_links)].render_batch(results, changes)
@@ -0,0 +1,100 @@
+import os
+import threading
+from typing import Iterable
+
+from metrics import FILTERED
+from mirror import normalize_id
+
+# Типы, по которым run.py что-то делает; page.moved и page.content_updated только логировались,
+# а content_updated ещё и стоил pages.retrieve
+DEFAULT_EVENT_TYPES = (
+    "database.content_updated",
+    "database.schema_updated",
+    "page.created",
+    "page.properties_updated",
+    "page.deleted",
+    "page.undeleted",
+)
+
+
+def _split(value: str) -> list[str]:
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+def event_database(event: dict) -> str | None:
+    """База, к которой относится событие, по данным самого payload (без запросов к Notion)."""
+    entity = event.get("entity") or {}
+    if entity.get("type") == "database":
+        return entity.get("id")
+
+    # id источника данных (data_source) — не id базы: такие события проверяются после pages.retrieve
+    parent = (event.get("data") or {}).get("parent") or {}
+    if parent.get("type") == "database":
+        return parent.get("id")
+    return None
+
+
+class EventFilter:
+    """Отсев событий до журнала, очереди и любых запросов к Notion/Telegram.
+
+    Пропускает только типы из allow-list, отбрасывает страницы вне баз и, если задан
+    список баз, события чужих баз. Для событий страниц база берётся из data.parent;
+    если parent в payload нет или это data_source, событие пропускается и проверяется
+    уже после pages.retrieve через accept_database().
+    """
+
+    def __init__(self, event_types: Iterable[str] = DEFAULT_EVENT_TYPES, databases: Iterable[str] = ()):
+        self.event_types = frozenset(event_types)
+        self.databases = frozenset(normalize_id(db_id) for db_id in databases if db_id)
+        self._lock = threading.Lock()
+
+        self.passed = 0
+        self.dropped: dict[str, int] = {}
+
+    @classmethod
+    def from_env(cls, subscribed: Iterable[str] | None = ()) -> "EventFilter":
+        event_types = _split(os.getenv("NOTION_EVENT_TYPES", "")) or DEFAULT_EVENT_TYPES
+        # Явный список баз; иначе базы из подписок и база сделок; subscribed=None — подписка на все базы
+        databases = _split(os.getenv("NOTION_WATCHED_DATABASES", ""))
+        if not databases and subscribed is not None:
+            databases = [*subscribed, *_split(os.getenv("TRADES_DATABASE_ID", ""))]
+        return cls(event_types, databases)
+
+    def reason(self, event: dict) -> str | None:
+        """Причина отсева или None, если событие нужно обрабатывать."""
+        if event.get("type") not in self.event_types:
+            return "event_type"
+
+        database_id = event_database(event)
+        if database_id is None:
+            # Страница вне баз: уведомлять не о чем, а pages.retrieve ради этого не нужен
+            parent = (event.get("data") or {}).get("parent") or {}
+            return "parent" if parent.get("type") in ("page", "workspace", "space", "block") else None
+
+        if self.databases and normalize_id(database_id) not in self.databases:
+            return "database"
+        return None
+
+    def accept(self, event: dict) -> bool:
+        reason = self.reason(event)
+        with self._lock:
+            if reason is None:
+                self.passed += 1
+            else:
+                self.dropped[reason] = self.dropped.get(reason, 0) + 1
+        if reason is not None:
+            FILTERED.labels(reason).inc()
+        return reason is None
+
+    def accept_database(self, database_id: str | None) -> bool:
+        """Проверка базы страницы, известной только после pages.retrieve."""
+        if not self.databases or (database_id and normalize_id(database_id) in self.databases):
+            return True
+        with self._lock:
+            self.dropped["database"] = self.dropped.get("database", 0) + 1
+        FILTERED.labels("database").inc()
+        return False
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"passed": self.passed, "dropped": dict(self.dropped)}
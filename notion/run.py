@@ -1,130 +1,197 @@
 import os
-# import hmac
-# import hashlib
 import json
+import time
+import atexit
 import logging
-import requests
 
-from typing import Dict, List
+from typing import Dict, List, Tuple
+from concurrent.futures import ThreadPoolExecutor
 from notion_client import Client
 from waitress import serve
-from flask import Flask, request, jsonify, Blueprint
-from dotenv import load_dotenv, set_key, get_key
-from logging.handlers import RotatingFileHandler
+from flask import Flask, Response, request, jsonify, Blueprint, g
+from dotenv import find_dotenv, load_dotenv, set_key
+from werkzeug.exceptions import RequestEntityTooLarge
 
 from utilites import Utils
+from pipeline import EventPipeline
+from page_cache import PageCache, parse_timestamp
+from ratelimit import TokenBucket, call_with_retry
+from sender import TelegramSender
+from signature import SignatureVerifier, is_handshake
+from logsetup import bind_event, event_id, log_payload, setup_logging
+from journal import EventJournal
+from dedup import DedupIndex
+from routing import EventFilter, event_database
+from subscriptions import SubscriptionTable
+from mirror import TradesMirror
+from state import PageStateCache, diff_values
+import metrics
+from metrics import ERRORS, EVENTS, EVENT_LATENCY, WEBHOOK_LATENCY, observe
+from properties import EXTRACTORS, SchemaCache, SchemaUnavailable, decode_property_ids, extract_page_values, index_properties
 
 # Инициализация
-load_dotenv()
+# Токен рукопожатия сохраняется в тот же .env, из которого читается конфигурация
+ENV_PATH = find_dotenv() or os.path.join(os.path.dirname(os.path.abspath(__file__)), '.env')
+load_dotenv(ENV_PATH)
 app = Flask(__name__)
+# Тела больше лимита отклоняются с 413 ещё до чтения
+app.config['MAX_CONTENT_LENGTH'] = int(os.getenv('NOTION_MAX_BODY', 1024 * 1024))
 routes = Blueprint("routes", __name__)
 
 
-# Настройка логирования
-def setup_logging():
-    logger = logging.getLogger('notion_webhook')
-    logger.setLevel(logging.DEBUG)
-
-    handler = RotatingFileHandler(
-        'notion_webhook.log',
-        maxBytes=1024 * 1024,
-        backupCount=3
-    )
-    formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-    handler.setFormatter(formatter)
-    logger.addHandler(handler)
-
-    return logger
-
-
+# Логи пишет отдельный поток через очередь, см. logsetup.py
 logger = setup_logging()
 
 # Инициализация Notion Client
-notion = Client(auth=os.getenv("NOTION_TOKEN"))
+notion = Client(auth=os.getenv("NOTION_TOKEN"), base_url=os.getenv("NOTION_API_URL", "https://api.notion.com"))
 TELEGRAM_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
-WEBHOOK_TOKEN = os.getenv("NOTION_WEBHOOK_TOKEN")
-
 
-class NotionWebhookHandler:
-    @staticmethod
-    def verify_signature(request) -> bool:
-        if not WEBHOOK_TOKEN:
-            logger.error("Notion WEBHOOK_TOKEN not configured")
-            return False
-
-        signature_header = request.headers.get('X-Notion-Signature')
-        if not signature_header:
-            logger.warning("Missing X-Notion-Signature header")
-            return False
-
-        body_bytes = request.get_data()
-        mac = hmac.new(WEBHOOK_TOKEN.encode('utf-8'), body_bytes, hashlib.sha256)
-        expected = "sha256=" + mac.hexdigest()
+# NOTION_WEBHOOK_TOKENS — дополнительные секреты через запятую на время ротации
+verifier = SignatureVerifier.from_env()
+VERIFY_SIGNATURE = os.getenv("NOTION_VERIFY_SIGNATURE", "1") == "1"
+if VERIFY_SIGNATURE and not verifier.configured:
+    logger.warning("🔏 NOTION_WEBHOOK_TOKEN не задан — события будут отклоняться до рукопожатия")
+
+sender = TelegramSender.from_env()
+sender.start()
+atexit.register(sender.stop)
+
+# База -> чаты/темы (NOTION_SUBSCRIPTIONS), без файла — всё в TELEGRAM_CHAT_ID
+subscriptions = SubscriptionTable.from_env()
+
+# Все запросы к Notion идут через общий лимитер (~3 req/s) с учётом Retry-After
+limiter = TokenBucket(
+    rate=float(os.getenv("NOTION_RATE_LIMIT", 3)),
+    capacity=float(os.getenv("NOTION_RATE_BURST", 3)),
+)
+resolver = ThreadPoolExecutor(
+    max_workers=int(os.getenv("NOTION_CONCURRENCY", 3)),
+    thread_name_prefix="notion-resolver",
+)
+
+# Одна страница — один pages.retrieve на событие и на пачку событий в окне
+pages = PageCache(
+    lambda page_id: call_with_retry(limiter, notion.pages.retrieve, page_id),
+    ttl=float(os.getenv("NOTION_PAGE_CACHE_TTL", 5)),
+)
+
+# Схемы баз (id свойства -> имя, тип) живут до события database.schema_updated
+schema = SchemaCache(lambda db_id: call_with_retry(limiter, notion.databases.retrieve, db_id))
+
+# Локальное зеркало базы сделок (включается TRADES_DATABASE_ID)
+mirror = None
+if os.getenv("TRADES_DATABASE_ID"):
+    mirror = TradesMirror(
+        os.getenv("TRADES_DB_PATH", "trades.db"),
+        os.getenv("TRADES_DATABASE_ID"),
+        lambda **params: call_with_retry(limiter, notion.databases.query, **params),
+    )
+    mirror.start(interval=float(os.getenv("TRADES_SYNC_INTERVAL", 300)))
+    atexit.register(mirror.stop)
+
+# Прежние значения свойств страниц для уведомлений только о разнице; после рестарта — из зеркала
+states = PageStateCache(
+    maxsize=int(os.getenv("NOTION_STATE_CACHE_SIZE", 10_000)),
+    fallback=mirror.state if mirror is not None else None,
+)
+
+
+def notify(database_id: str | None, result: List[dict], changes: List[dict | None] | None = None):
+    """Раздача по подпискам базы: каждому чату/теме — свои записи, отправки идут параллельно в sender."""
+    rendered: Dict[tuple, str] = {}
+    for (chat_id, thread_id), indexes in subscriptions.route(database_id, result).items():
+        key = tuple(indexes)
+        # Одинаковый набор записей для нескольких чатов рендерится один раз
+        if key not in rendered:
+            rendered[key] = Utils.format_notion_telegram_message(
+                [result[i] for i in indexes],
+                changes=[changes[i] for i in indexes] if changes is not None else None,
+            )
+        sender.send(chat_id, rendered[key], parse_mode="HTML", thread_id=thread_id)
+
+
+def fetch_page(page_id: str, event_time=None) -> dict | None:
+    try:
+        return pages.get(page_id, event_time)
+    except Exception as e:
+        logger.error(f"❌ Не удалось получить страницу {page_id}: {e}")
+        return None
+
+
+def extract_page_properties(page: dict) -> Tuple[dict, dict | None]:
+    """Значения свойств и известные до этой правки (None — неизвестны)."""
+    values = extract_page_values(page.get("properties", {}))
+    # Сначала кэш состояний: его запасной источник — зеркало, которое обновляется следом
+    old = states.swap(page["id"], values, page.get("last_edited_time"))
+    if mirror is not None:
+        mirror.upsert_page(page)
+    return values, old
+
+
+def collect_page(page: dict, result: List[dict], changes: List[dict | None]) -> bool:
+    """Добавить страницу в уведомление: целиком, если прежнее состояние неизвестно, иначе только разницу.
+
+    Одна правка строки приходит и как database.content_updated, и как page.properties_updated;
+    второе из событий видит уже сохранённые значения и ничего не добавляет.
+    """
+    values, old = extract_page_properties(page)
+    diff = diff_values(old, values) if old is not None else None
+    if diff == {}:
+        logger.info("🛠 Свойства страницы %.8s не изменились по сравнению с известным состоянием", page["id"])
+        return False
+    result.append(values)
+    changes.append(diff)
+    return True
 
-        if not hmac.compare_digest(expected, signature_header):
-            logger.error("Signature mismatch")
-            return False
 
+def tracks_any(database_id: str | None, property_ids: List[str]) -> bool:
+    """Есть ли среди обновлённых свойств те, что попадают в уведомление (по схеме, без pages.retrieve)."""
+    if not database_id:
         return True
-
-def send_telegram_notification(message: str) -> bool:
-    if not TELEGRAM_TOKEN or not CHAT_ID:
-        logger.error("Telegram credentials not configured")
+    if not property_ids:
         return False
-
-    url = f"https://api.telegram.org/bot{TELEGRAM_TOKEN}/sendMessage"
-    payload = {
-        "chat_id": CHAT_ID,
-        "text": message[:1000] or "Empty message",
-        "parse_mode": "HTML"
-    }
     try:
-        response = requests.post(url, json=payload, timeout=20)
-        response.raise_for_status()
+        types = schema.get(database_id)
+    except SchemaUnavailable:
+        # Ошибка уже залогирована при первой попытке, повтор — после failure_ttl
         return True
     except Exception as e:
-        logger.error(f"Failed to send Telegram notification: {str(e)}")
+        logger.warning("📐 Схема базы %.8s недоступна, страница будет запрошена: %s", database_id, e)
+        return True
+    decoded = decode_property_ids(property_ids)
+    # Неизвестный id — схема устарела, лучше запросить страницу
+    return any(prop_id not in types or types[prop_id][1] in EXTRACTORS for prop_id in decoded)
+
+
+def is_page_in_database(page: dict | None) -> bool:
+    if not page or page.get("parent", {}).get("type") != "database_id":
         return False
+    # События с data_source-родителем фильтр пропустил без базы — сверяем её по самой странице
+    return events_filter.accept_database(page["parent"].get("database_id"))
 
-def extract_page_properties(page_id: str) -> dict:
-    try:
-        page = notion.pages.retrieve(page_id)
-        properties = page.get("properties", {})
-        values = {}
-        for field, prop in properties.items():
-            values[field] = Utils.extract_property_value(prop)
-        return values
-    except Exception as e:
-        logger.error(f"❌ Не удалось извлечь свойства страницы {page_id}: {e}")
-        return {}
 
-def is_page_in_database(page_id: str) -> bool:
+def resolve_block(db_id, block_id, event_time=None) -> dict | None:
     try:
-        page = notion.pages.retrieve(page_id)
-        return page.get("parent", {}).get("type") == "database_id"
+        block = call_with_retry(limiter, notion.blocks.retrieve, block_id)
     except Exception as e:
-        logger.warning(f"⚠️ Не удалось проверить принадлежность страницы {page_id}: {e}")
-        return False
+        logger.warning(f"❌ Ошибка при обработке блока {block_id}: {e}")
+        return None
 
+    parent = block.get('parent', {})
 
-def get_update_blocks(db_id, ids):
-    info = []
+    # Прямо внутри базы — сразу забираем страницу со свойствами
+    if ((parent.get('type') == 'database_id' and parent.get('database_id') == db_id)
+            and block.get("type") == 'child_page'):
+        return fetch_page(block.get("id"), event_time)
 
-    for block_id in ids:
-        try:
-            block = notion.blocks.retrieve(block_id)
-            parent = block.get('parent', {})
+    return None
 
-            # Прямо внутри базы
-            if ((parent.get('type') == 'database_id' and parent.get('database_id') == db_id)
-                    and block.get("type") == 'child_page'):
-                info.append(block.get("id"))
 
-        except Exception as e:
-            logger.warning(f"❌ Ошибка при обработке блока {block_id}: {e}")
-
-    return info
+def get_update_blocks(db_id, ids, event_time=None) -> List[dict]:
+    # Блоки и их страницы резолвятся параллельно, темп задаёт общий limiter
+    found = resolver.map(lambda block_id: resolve_block(db_id, block_id, event_time), ids)
+    return [page for page in found if page]
 
 
 def process_notion_event(raw):
@@ -133,71 +200,197 @@ def process_notion_event(raw):
     data = raw.get('data', {})
     entity_type = entity.get('type')
     entity_id = entity.get('id')
+    event_time = parse_timestamp(raw.get('timestamp'))
 
-    logger.info(f"📌 Событие: {event_type} (entity: {entity_type}, id: {entity_id})")
+    logger.info("📌 Событие: %s (entity: %s, id: %s)", event_type, entity_type, entity_id)
 
     result: List[dict] = []
+    # По записи: только изменившиеся поля или None — запись целиком (прежнее состояние неизвестно)
+    changes: List[dict | None] = []
+    # База события для маршрутизации по подпискам; у страниц уточняется по parent
+    database_id = entity_id if entity_type == "database" else event_database(raw)
 
     if event_type == "database.content_updated":
         update_blocks_id = [bl.get('id') for bl in data.get("updated_blocks", [])]
-        update_block = get_update_blocks(entity_id, update_blocks_id)
-        for id in update_block:
-            result.append(extract_page_properties(id))
+        for page in get_update_blocks(entity_id, update_blocks_id, event_time):
+            collect_page(page, result, changes)
 
     elif event_type == "database.schema_updated":
-        logger.info("📐 Обновлена схема базы данных. Можно добавить логику изменения типов/структуры.")
+        schema.invalidate(entity_id)
+        logger.info("📐 Обновлена схема базы данных %.8s — кэш схемы сброшен", entity_id)
 
     elif event_type == "page.created":
-        if is_page_in_database(entity_id):
-            result.append(extract_page_properties(entity_id))
-            logger.info(f"🆕 Создана новая страница в базе: {entity_id[:8]}")
+        page = fetch_page(entity_id, event_time)
+        if is_page_in_database(page):
+            database_id = page["parent"]["database_id"]
+            collect_page(page, result, changes)
+            logger.info("🆕 Создана новая страница в базе: %.8s", entity_id)
 
     elif event_type == "page.properties_updated":
-        if is_page_in_database(entity_id):
-            result.append(extract_page_properties(entity_id))
-            logger.info(f"🛠 Изменены свойства страницы {entity_id[:8]}")
+        updated = data.get("updated_properties", [])
+        # databases.retrieve принимает только id базы; у data_source-родителя схему не проверяем
+        parent = data.get("parent") or {}
+        if not tracks_any(parent.get("id") if parent.get("type") == "database" else None, updated):
+            logger.info("🛠 У страницы %.8s изменились только неотображаемые свойства — запрос пропущен", entity_id)
+            page = None
+        else:
+            page = fetch_page(entity_id, event_time)
+        if is_page_in_database(page):
+            database_id = page["parent"]["database_id"]
+            collect_page(page, result, changes)
+            if logger.isEnabledFor(logging.INFO):
+                by_id = index_properties(page.get("properties", {}))
+                changed = [by_id[prop_id][0] for prop_id in decode_property_ids(updated)
+                           if prop_id in by_id]
+                logger.info("🛠 Изменены свойства страницы %.8s: %s", entity_id, ", ".join(changed) or "—")
 
     elif event_type == "page.content_updated":
-        if is_page_in_database(entity_id):
-            logger.info(f"✏️ Изменено содержимое страницы {entity_id[:8]} — но свойства остались прежними")
+        if is_page_in_database(fetch_page(entity_id, event_time)):
+            logger.info("✏️ Изменено содержимое страницы %.8s — но свойства остались прежними", entity_id)
 
     elif event_type == "page.moved":
-        logger.info(f"📦 Страница {entity_id[:8]} была перемещена — можно отследить изменение parent")
+        logger.info("📦 Страница %.8s была перемещена — можно отследить изменение parent", entity_id)
 
     elif event_type == "page.deleted":
-        logger.warning(f"🗑 Удалена страница {entity_id[:8]}")
+        logger.warning("🗑 Удалена страница %.8s", entity_id)
+        states.forget(entity_id)
+        if mirror is not None:
+            mirror.mark_archived(entity_id)
 
     elif event_type == "page.undeleted":
-        logger.info(f"♻️ Страница {entity_id[:8]} восстановлена")
+        logger.info("♻️ Страница %.8s восстановлена", entity_id)
+        # Строка зеркала осталась archived = 1 — перечитываем страницу, чтобы сделка вернулась в /trades и /pnl
+        if mirror is not None:
+            page = fetch_page(entity_id, event_time)
+            if is_page_in_database(page):
+                extract_page_properties(page)
 
     else:
-        logger.warning(f"⚠️ Необработанный тип события: {event_type}")
+        logger.warning("⚠️ Необработанный тип события: %s", event_type)
 
-    # Отправка Telegram
-    message = Utils.format_notion_telegram_message(result)
-    send_telegram_notification(message)
+    # Отправка Telegram; без извлечённых страниц уведомлять не о чем
+    if result:
+        notify(database_id, result, changes)
 
     return result
 
 
+def handle_event(event):
+    try:
+        with bind_event(event), observe(EVENT_LATENCY):
+            process_notion_event(event)
+    except Exception:
+        ERRORS.labels("event").inc()
+        raise
+    finally:
+        journal.mark_processed(event.get("_offsets", []))
+
+
+# Журнал: событие сначала пишется на диск, потом подтверждается Notion
+journal = EventJournal(os.getenv("NOTION_JOURNAL_PATH", "events.db"))
+atexit.register(journal.close)
+
+# Очередь событий: эндпоинт только принимает событие, обработка идёт в воркерах
+pipeline = EventPipeline(
+    handle_event,
+    workers=int(os.getenv("NOTION_WORKERS", 4)),
+    maxsize=int(os.getenv("NOTION_QUEUE_SIZE", 1000)),
+    debounce=int(os.getenv("NOTION_DEBOUNCE_MS", 1000)) / 1000,
+)
+pipeline.start()
+atexit.register(pipeline.stop)
+
+metrics.track_queue("events", pipeline.queue.qsize, pipeline.oldest_age)
+metrics.track_queue("telegram", sender.pending)
+
+
+# NOTION_EVENT_TYPES и NOTION_WATCHED_DATABASES (по умолчанию — базы из подписок и база сделок), см. routing.py
+events_filter = EventFilter.from_env(subscriptions.databases())
+
+# Повторные доставки Notion отбрасываются до журнала и любых запросов наружу
+dedup = DedupIndex(window=float(os.getenv("NOTION_DEDUP_WINDOW", 3600)))
+if os.getenv("NOTION_DEDUP_PERSIST", "1") == "1":
+    dedup.load(journal.recent(dedup.window))
+
+
+def replay_journal():
+    # События, принятые до рестарта, но не обработанные
+    pending = journal.pending()
+    for offset, event in pending:
+        event["_offsets"] = [offset]
+        if not pipeline.submit(event):
+            logger.warning("🚧 Очередь заполнена, остаток журнала проиграется при следующем старте")
+            break
+    if pending:
+        logger.info(f"♻️ Из журнала восстановлено событий: {len(pending)}")
+
+
+replay_journal()
+
+
+@routes.before_request
+def start_timer():
+    g.started = time.perf_counter()
+    # Поток waitress переиспользуется — id прошлого события не должен попасть в чужие логи
+    event_id.set(None)
+
+
+@routes.after_request
+def record_latency(response):
+    WEBHOOK_LATENCY.labels(request.method, response.status_code).observe(time.perf_counter() - g.started)
+    return response
+
+
+@routes.route('/metrics')
+def metrics_endpoint():
+    body, content_type = metrics.render()
+    return Response(body, content_type=content_type)
+
+
 @routes.route('/notion-webhook', methods=['GET', 'POST'])
 def webhook_endpoint():
     try:
         if request.method == 'GET':
-            return jsonify({"status": "active"}), 200
+            return jsonify({
+                "status": "active",
+                "queue": pipeline.stats(),
+                "pages": pages.stats(),
+                "notifications": sender.stats(),
+                "journal": journal.stats(),
+                "dedup": dedup.stats(),
+                "filter": events_filter.stats(),
+                "states": states.stats(),
+            }), 200
 
         if not request.is_json:
             return jsonify({"error": "Content-Type must be application/json"}), 400
 
-        data = request.get_json()
+        # Подпись проверяется по сырым байтам до разбора JSON и любых запросов наружу
+        body = request.get_data()
+        signed = not VERIFY_SIGNATURE or verifier.verify(body, request.headers.get('X-Notion-Signature'))
+        if not signed and not is_handshake(body):
+            EVENTS.labels("bad_signature").inc()
+            logger.warning("🔏 Неверная подпись X-Notion-Signature, запрос отклонён")
+            return jsonify({"error": "Invalid signature"}), 403
+
+        try:
+            data = json.loads(body)
+        except ValueError:
+            return jsonify({"error": "Invalid JSON"}), 400
+        event_id.set(data.get('id'))
+        log_payload(logger, data)
 
         if 'verification_token' in data:
             logger.info(f"📬 Получен verification_token: {data['verification_token'][:8]}...")
 
-            # Сохраняем в .env, если не сохранён
-            if not get_key('.env', 'NOTION_WEBHOOK_TOKEN'):
-                set_key('.env', 'NOTION_WEBHOOK_TOKEN', data['verification_token'])
-                logger.info("🔐 verification_token сохранён в .env")
+            # Токен принимается, только пока секрета нет; при заданном секрете неподписанное рукопожатие — подделка
+            if verifier.claim(data['verification_token']):
+                set_key(ENV_PATH, 'NOTION_WEBHOOK_TOKEN', data['verification_token'])
+                logger.info("🔐 verification_token сохранён в %s", ENV_PATH)
+            elif not signed:
+                EVENTS.labels("bad_signature").inc()
+                logger.warning("🔏 Неподписанное рукопожатие при заданном секрете, запрос отклонён")
+                return jsonify({"error": "Invalid signature"}), 403
 
             # Возвращаем challenge для подтверждения
             return jsonify({"challenge": data['verification_token']}), 200
@@ -207,14 +400,43 @@ def webhook_endpoint():
 
             return jsonify({"challenge": data['challenge']}), 200
 
-        # if not NotionWebhookHandler.verify_signature(request):
-        # 	return jsonify({"error": "Invalid signature"}), 403
+        # Без подписи пропускаются только рукопожатия выше
+        if not signed:
+            EVENTS.labels("bad_signature").inc()
+            return jsonify({"error": "Invalid signature"}), 403
 
-        result = process_notion_event(data)
-        return jsonify(result), 200
+        # Лишние типы и чужие базы отсекаются по самому payload, 200 — чтобы Notion не повторял
+        if not events_filter.accept(data):
+            EVENTS.labels("filtered").inc()
+            return jsonify({"status": "ignored"}), 200
 
+        if dedup.check(data):
+            logger.info("🔁 Повторная доставка события %s, пропускаем", data.get('id'))
+            EVENTS.labels("duplicate").inc()
+            return jsonify({"status": "duplicate"}), 200
+
+        try:
+            data["_offsets"] = [journal.append(data)]
+        except Exception:
+            dedup.forget(data)
+            raise
+
+        # Очередь переполнена — отвечаем 503, Notion повторит доставку позже
+        if not pipeline.submit(data):
+            journal.mark_processed(data["_offsets"])
+            dedup.forget(data)
+            logger.warning("🚧 Очередь событий переполнена, событие отклонено")
+            EVENTS.labels("rejected").inc()
+            return jsonify({"error": "Queue is full"}), 503
+
+        EVENTS.labels("queued").inc()
+        return jsonify({"status": "queued"}), 200
+
+    except RequestEntityTooLarge:
+        return jsonify({"error": "Payload too large"}), 413
     except Exception as e:
         logger.exception("Webhook error")
+        ERRORS.labels("webhook").inc()
         return jsonify({"error": str(e)}), 500
 
 
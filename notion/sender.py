@@ -0,0 +1,250 @@
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from ratelimit import TokenBucket
+from metrics import ERRORS, RATE_LIMITED, TELEGRAM_LATENCY, observe
+
+logger = logging.getLogger('notion_webhook')
+
+TELEGRAM_API_URL = "https://api.telegram.org"
+# Лимит sendMessage — 4096 символов (UTF-16), длиннее режем, а не обрезаем
+MESSAGE_LIMIT = 4096
+
+
+def utf16_len(text: str) -> int:
+    return len(text.encode("utf-16-le")) // 2
+
+
+def _safe_cut(chunk: str) -> int:
+    # Не разрывать &amp;/&lt; и теги: Telegram отклонит часть с «can't parse entities»
+    cut = len(chunk)
+    for opener, closer in (("&", ";"), ("<", ">")):
+        start = chunk.rfind(opener, 0, cut)
+        if start > 0 and chunk.find(closer, start, cut) == -1:
+            cut = start
+    return cut
+
+
+def split_message(text: str, limit: int = MESSAGE_LIMIT) -> list[str]:
+    if utf16_len(text) <= limit:
+        return [text]
+
+    # Режем по строкам: HTML-теги форматтера не переходят через перевод строки
+    parts = []
+    current = ""
+    for line in text.split("\n"):
+        while utf16_len(line) > limit:
+            if current:
+                parts.append(current)
+                current = ""
+            cut = limit
+            while utf16_len(line[:cut]) > limit:
+                cut -= 1
+            cut = _safe_cut(line[:cut])
+            parts.append(line[:cut])
+            line = line[cut:]
+
+        candidate = f"{current}\n{line}" if current else line
+        if utf16_len(candidate) > limit:
+            parts.append(current)
+            current = line
+        else:
+            current = candidate
+
+    if current:
+        parts.append(current)
+    return parts
+
+
+class TelegramSender:
+    """Отправка в Telegram из фоновых потоков.
+
+    Keep-alive сессия, очередь на каждый чат, лимиты Telegram (глобальный и на чат),
+    повтор по retry_after на 429 и склейка нескольких ожидающих сообщений одного чата в одно.
+    """
+
+    def __init__(
+        self,
+        token: str | None,
+        api_url: str = TELEGRAM_API_URL,
+        workers: int = 4,
+        global_rate: float = 30.0,
+        chat_interval: float = 1.0,
+        timeout: float = 20.0,
+    ):
+        self.token = token
+        self.api_url = api_url.rstrip("/")
+        self.workers = workers
+        self.chat_interval = chat_interval
+        self.timeout = timeout
+        self.bucket = TokenBucket(rate=global_rate, capacity=global_rate)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=workers)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        # chat_id -> очередь (text, parse_mode, thread_id); лимиты Telegram — на чат, а не на тему
+        self._queues: dict[str, deque] = {}
+        self._next_allowed: dict[str, float] = {}
+        self._in_flight: set[str] = set()
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._threads: list[threading.Thread] = []
+        self._stopping = False
+
+        self.queued = 0
+        self.sent = 0
+        self.failed = 0
+        self.merged = 0
+        self.retried = 0
+
+    @classmethod
+    def from_env(cls) -> "TelegramSender":
+        return cls(
+            os.getenv("TELEGRAM_BOT_TOKEN"),
+            api_url=os.getenv("TELEGRAM_API_URL", TELEGRAM_API_URL),
+            workers=int(os.getenv("TELEGRAM_SENDER_WORKERS", 4)),
+            global_rate=float(os.getenv("TELEGRAM_GLOBAL_RATE", 30)),
+            chat_interval=float(os.getenv("TELEGRAM_CHAT_INTERVAL", 1)),
+        )
+
+    def start(self):
+        self._stopping = False
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"telegram-sender-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: float = 10.0):
+        # Даём дослать очередь, но не дольше timeout
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            while (self._queues or self._in_flight) and time.monotonic() < deadline:
+                self._changed.wait(deadline - time.monotonic())
+            self._stopping = True
+            self._changed.notify_all()
+        for thread in self._threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+        self._threads.clear()
+
+    def send(self, chat_id, text: str, parse_mode: str | None = "HTML", thread_id: int | None = None) -> bool:
+        if not self.token or not chat_id:
+            logger.error("Telegram credentials not configured")
+            return False
+
+        chat_id = str(chat_id)
+        parts = split_message(text or "Empty message")
+        with self._lock:
+            queue = self._queues.setdefault(chat_id, deque())
+            queue.extend((part, parse_mode, thread_id) for part in parts)
+            self.queued += len(parts)
+            self._changed.notify()
+        return True
+
+    def _take(self) -> tuple[str, str, str | None, int | None] | None:
+        # Вызывается под self._lock: берём чат, который не занят и не упирается в свой лимит
+        while True:
+            if self._stopping:
+                return None
+
+            now = time.monotonic()
+            wait = None
+            for chat_id in self._queues:
+                if chat_id in self._in_flight:
+                    continue
+                ready_at = self._next_allowed.get(chat_id, 0.0)
+                if ready_at <= now:
+                    return chat_id, *self._batch(chat_id)
+                wait = ready_at - now if wait is None else min(wait, ready_at - now)
+
+            self._changed.wait(wait)
+
+    def _batch(self, chat_id: str) -> tuple[str, str | None, int | None]:
+        queue = self._queues[chat_id]
+        text, parse_mode, thread_id = queue.popleft()
+
+        # Всё, что успело накопиться для чата (и той же темы), уходит одним сообщением
+        while queue and queue[0][1:] == (parse_mode, thread_id):
+            candidate = f"{text}\n\n{queue[0][0]}"
+            if utf16_len(candidate) > MESSAGE_LIMIT:
+                break
+            text = candidate
+            queue.popleft()
+            self.merged += 1
+
+        if not queue:
+            del self._queues[chat_id]
+        self._in_flight.add(chat_id)
+        return text, parse_mode, thread_id
+
+    def _worker(self):
+        while True:
+            with self._lock:
+                item = self._take()
+            if item is None:
+                return
+
+            chat_id, text, parse_mode, thread_id = item
+            retry_after = None
+            try:
+                self.bucket.acquire()
+                retry_after = self._post(chat_id, text, parse_mode, thread_id)
+            finally:
+                with self._lock:
+                    self._in_flight.discard(chat_id)
+                    delay = self.chat_interval if retry_after is None else retry_after
+                    self._next_allowed[chat_id] = time.monotonic() + delay
+                    if retry_after is not None:
+                        # Повторяем первым в очереди чата
+                        self._queues.setdefault(chat_id, deque()).appendleft((text, parse_mode, thread_id))
+                        self.retried += 1
+                    self._changed.notify_all()
+
+    def _post(self, chat_id: str, text: str, parse_mode: str | None, thread_id: int | None = None) -> float | None:
+        """Возвращает retry_after, если Telegram попросил подождать (429)."""
+        payload = {"chat_id": chat_id, "text": text}
+        if parse_mode:
+            payload["parse_mode"] = parse_mode
+        if thread_id is not None:
+            payload["message_thread_id"] = thread_id
+
+        url = f"{self.api_url}/bot{self.token}/sendMessage"
+        try:
+            with observe(TELEGRAM_LATENCY):
+                response = self.session.post(url, json=payload, timeout=self.timeout)
+            if response.status_code == 429:
+                RATE_LIMITED.labels("telegram").inc()
+                retry_after = float(response.json().get("parameters", {}).get("retry_after", 1))
+                logger.warning("⏳ Telegram 429 для чата %s, повтор через %.0f с", chat_id, retry_after)
+                return retry_after
+            response.raise_for_status()
+            with self._lock:
+                self.sent += 1
+        except Exception as e:
+            logger.error("Failed to send Telegram notification: %s", e)
+            ERRORS.labels("telegram").inc()
+            with self._lock:
+                self.failed += 1
+        return None
+
+    def pending(self) -> int:
+        with self._lock:
+            return sum(len(queue) for queue in self._queues.values())
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "queued": self.queued,
+                "sent": self.sent,
+                "failed": self.failed,
+                "merged": self.merged,
+                "retried": self.retried,
+                "pending": sum(len(queue) for queue in self._queues.values()),
+            }
@@ -0,0 +1,70 @@
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Tuple
+
+State = Tuple[dict, str | None]
+
+Changes = Dict[str, Tuple[object, object]]
+
+
+def diff_values(old: dict, new: dict) -> Changes:
+    """Поле -> (было, стало) только для изменившихся значений."""
+    return {
+        field: (old.get(field), value)
+        for field, value in new.items()
+        if field != "id" and old.get(field) != value
+    }
+
+
+class PageStateCache:
+    """Последние известные значения свойств страниц — чтобы слать только разницу.
+
+    swap() под одной блокировкой возвращает прежние значения и запоминает новые,
+    поэтому database.content_updated и page.properties_updated об одной правке
+    не отправят её дважды: второе событие увидит те же значения и пустую разницу.
+    Повторная доставка и новая правка в ту же минуту различаются по самим значениям,
+    а не по last_edited_time (Notion округляет его до минуты).
+
+    При промахе (например, после рестарта) спрашивается fallback — у базы сделок это
+    её SQLite-зеркало. Ему доверяем, только если его last_edited_time строго раньше
+    текущей правки: синхронизация могла успеть записать уже новые значения.
+    """
+
+    def __init__(self, maxsize: int = 10_000, fallback: Callable[[str], State | None] | None = None):
+        self.maxsize = maxsize
+        self.fallback = fallback
+        self._pages: OrderedDict[str, State] = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def swap(self, page_id: str, values: dict, edited: str | None = None) -> dict | None:
+        """Запомнить значения правки edited и вернуть известные до неё (None — неизвестны)."""
+        with self._lock:
+            state = self._pages.get(page_id)
+            self._pages[page_id] = (values, edited)
+            self._pages.move_to_end(page_id)
+            while len(self._pages) > self.maxsize:
+                self._pages.popitem(last=False)
+
+        old = state[0] if state is not None else None
+        if state is None and self.fallback is not None:
+            mirrored = self.fallback(page_id)
+            if mirrored is not None and edited and mirrored[1] and mirrored[1] < edited:
+                old = mirrored[0]
+
+        with self._lock:
+            if old is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return old
+
+    def forget(self, page_id: str):
+        with self._lock:
+            self._pages.pop(page_id, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"size": len(self._pages), "hits": self.hits, "misses": self.misses}
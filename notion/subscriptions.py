@@ -0,0 +1,90 @@
+import json
+import logging
+import os
+from typing import Dict, Iterable, List, Tuple
+
+from mirror import normalize_id
+
+logger = logging.getLogger('notion_webhook')
+
+# (chat_id, message_thread_id) — тема форума или None для обычного чата
+Target = Tuple[str, int | None]
+
+
+def _as_list(value) -> list:
+    return value if isinstance(value, list) else [value]
+
+
+class Subscription:
+    """Подписка чата (или темы форума) на базу; filters — {свойство: допустимые значения}."""
+
+    __slots__ = ("database_id", "target", "filters")
+
+    def __init__(self, database_id: str | None, chat_id, thread_id: int | None = None, filters: dict | None = None):
+        # database_id=None — все базы
+        self.database_id = normalize_id(database_id) if database_id and database_id != "*" else None
+        self.target: Target = (str(chat_id), int(thread_id) if thread_id is not None else None)
+        self.filters = {field: frozenset(map(str, _as_list(values))) for field, values in (filters or {}).items()}
+
+    @classmethod
+    def from_dict(cls, item: dict) -> "Subscription":
+        return cls(item.get("database"), item["chat"], item.get("topic"), item.get("filter"))
+
+    def matches(self, entry: dict) -> bool:
+        for field, allowed in self.filters.items():
+            value = entry.get(field)
+            # multi_select/people приходят списком — достаточно пересечения
+            values = value if isinstance(value, list) else [value]
+            if allowed.isdisjoint(map(str, values)):
+                return False
+        return True
+
+
+class SubscriptionTable:
+    """Кому отправлять события какой базы: индекс database_id -> подписки, один поиск на событие.
+
+    Файл NOTION_SUBSCRIPTIONS — JSON-список вида
+    [{"database": "<id или *>", "chat": "-100…", "topic": 12, "filter": {"Статус": ["Активна"]}}].
+    Без файла всё уходит в TELEGRAM_CHAT_ID, как раньше.
+    """
+
+    def __init__(self, subscriptions: Iterable[Subscription] = (), default_chat: str | None = None):
+        self.subscriptions = list(subscriptions)
+        self.default_chat = default_chat
+        self._default = [Subscription(None, default_chat)] if default_chat else []
+        self._by_database: Dict[str | None, List[Subscription]] = {}
+        for subscription in self.subscriptions:
+            self._by_database.setdefault(subscription.database_id, []).append(subscription)
+
+    @classmethod
+    def from_env(cls) -> "SubscriptionTable":
+        default_chat = os.getenv("TELEGRAM_CHAT_ID")
+        path = os.getenv("NOTION_SUBSCRIPTIONS")
+        if not path:
+            return cls(default_chat=default_chat)
+
+        with open(path, encoding="utf-8") as f:
+            items = json.load(f)
+        subscriptions = [Subscription.from_dict(item) for item in items]
+        logger.info("📮 Загружено подписок: %d (баз: %d)", len(subscriptions), len({s.database_id for s in subscriptions}))
+        return cls(subscriptions, default_chat=default_chat)
+
+    def databases(self) -> List[str] | None:
+        """Базы, на которые есть подписки; None — если кто-то подписан на все."""
+        if None in self._by_database:
+            return None
+        return [db_id for db_id in self._by_database if db_id]
+
+    def lookup(self, database_id: str | None) -> List[Subscription]:
+        if not self.subscriptions:
+            return self._default
+        return self._by_database.get(normalize_id(database_id), []) + self._by_database.get(None, [])
+
+    def route(self, database_id: str | None, entries: List[dict]) -> Dict[Target, List[int]]:
+        """Цель -> индексы подходящих записей; одна цель из нескольких подписок получает их один раз."""
+        routes: Dict[Target, set] = {}
+        for subscription in self.lookup(database_id):
+            matched = [i for i, entry in enumerate(entries) if subscription.matches(entry)]
+            if matched:
+                routes.setdefault(subscription.target, set()).update(matched)
+        return {target: sorted(indexes) for target, indexes in routes.items()}
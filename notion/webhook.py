@@ -1,109 +1,77 @@
 import os
-import hmac
-import hashlib
+import atexit
 import json
+import time
 import requests
-from requests import Response
 
 from waitress import serve
-from flask import Flask, request, jsonify, Blueprint
+from flask import Flask, Response, request, jsonify, Blueprint, g
 from dotenv import load_dotenv
-import logging
-from logging.handlers import RotatingFileHandler
+from werkzeug.exceptions import RequestEntityTooLarge
+
+from sender import TelegramSender
+from routing import EventFilter
+from signature import SignatureVerifier, is_handshake
+from logsetup import event_id, log_payload, setup_logging
+import metrics
+from metrics import ERRORS, NOTION_LATENCY, RATE_LIMITED, WEBHOOK_LATENCY, observe
+from properties import decode_property_ids, display_property_value, index_properties
 
 # Инициализация
 load_dotenv()
 app = Flask(__name__)
+app.config['MAX_CONTENT_LENGTH'] = int(os.getenv('NOTION_MAX_BODY', 1024 * 1024))
 routes = Blueprint("routes", __name__)
 
 
-# Настройка логирования
-def setup_logging():
-    logger = logging.getLogger('notion_webhook')
-    logger.setLevel(logging.DEBUG)
-
-    handler = RotatingFileHandler(
-        'notion_webhook.log',
-        maxBytes=1024 * 1024,
-        backupCount=3
-    )
-    formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-    handler.setFormatter(formatter)
-    logger.addHandler(handler)
-
-    return logger
-
-
+# Логи пишет отдельный поток через очередь, см. logsetup.py
 logger = setup_logging()
 
 
-WEBHOOK_TOKEN = os.getenv('NOTION_WEBHOOK_TOKEN')
 NOTION_TOKEN = os.getenv('NOTION_TOKEN')
-TELEGRAM_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
 CHAT_ID = os.getenv('TELEGRAM_CHAT_ID')
 
-class NotionWebhookHandler:
+sender = TelegramSender.from_env()
+sender.start()
+atexit.register(sender.stop)
+metrics.track_queue("telegram", sender.pending)
+events_filter = EventFilter.from_env()
 
-    @staticmethod
-    def verify_signature(request) -> bool:
-        if not WEBHOOK_TOKEN:
-            logger.error("Notion WEBHOOK_TOKEN not configured")
+class NotionWebhookHandler:
+    # Активные секреты: NOTION_WEBHOOK_TOKEN и NOTION_WEBHOOK_TOKENS (через запятую, для ротации)
+    verifier = SignatureVerifier.from_env()
+    # NOTION_VERIFY_SIGNATURE=0 — проверка выключена (локальная отладка), как в run.py
+    enabled = os.getenv("NOTION_VERIFY_SIGNATURE", "1") == "1"
+
+    @classmethod
+    def verify_signature(cls, body: bytes, signature_header: str | None) -> bool:
+        if not cls.enabled:
+            return True
+
+        # Об отсутствии секрета предупреждаем один раз при старте, а не на каждый запрос
+        if not cls.verifier.configured:
             return False
 
-        signature_header = request.headers.get('X-Notion-Signature')
         if not signature_header:
             logger.warning("Missing X-Notion-Signature header")
             return False
 
         # Считаем HMAC от _сырых_ байт тела
-        body_bytes = request.get_data()
-
-        # Для отладки выведем первые 200 байт
-        logger.debug(f"Raw body for HMAC: {body_bytes[:200]!r}")
-
-        mac = hmac.new(secret.encode('utf-8'),
-                       body_bytes,
-                       hashlib.sha256)
-        expected = "sha256=" + mac.hexdigest()
-
-        logger.debug(f"Expected sig: {expected}")
-        logger.debug(f"Received sig: {signature_header}")
-
-        if not hmac.compare_digest(expected, signature_header):
+        logger.debug("Raw body for HMAC: %.200r", body)
+        if not cls.verifier.verify(body, signature_header):
             logger.error("Signature mismatch")
             return False
 
         return True
 
-def send_telegram_notification(message: str) -> bool:
-    if not TELEGRAM_TOKEN or not CHAT_ID:
-        logger.error("Telegram credentials not configured: "
-                     f"TOKEN={bool(TELEGRAM_TOKEN)}, CHAT_ID={bool(CHAT_ID)}")
-        return False
-
-    url = f"https://api.telegram.org/bot{TELEGRAM_TOKEN}/sendMessage"
-    payload = {
-        "chat_id": CHAT_ID,
-        "text": message[:1000] or "Empty message",
-        # "parse_mode": "Markdown"  # закомментируй для теста!
-    }
-
-    try:
-        # Отправляем JSON, чтобы Telegram сразу принял формат
-        response = requests.post(url, json=payload, timeout=20)
-        # Логируем статус и тело ответа, чтобы видеть текст ошибки:
-        logger.info(f"Telegram API response: {response.status_code} {response.text}")
 
-        # Если статус != 200, response.raise_for_status() вызовет HTTPError
-        response.raise_for_status()
-        return True
+if NotionWebhookHandler.enabled and not NotionWebhookHandler.verifier.configured:
+    logger.warning("🔏 NOTION_WEBHOOK_TOKEN не задан — события будут отклоняться")
 
-    except requests.exceptions.HTTPError as http_err:
-        logger.error(f"HTTPError from Telegram: {http_err}")
-    except Exception as e:
-        logger.exception(f"Unexpected error sending to Telegram: {e}")
 
-    return False
+def send_telegram_notification(message: str) -> bool:
+    # Markdown здесь не экранируется до конца, поэтому шлём без parse_mode
+    return sender.send(CHAT_ID, message, parse_mode=None)
 
 
 def get_page_properties(page_id):
@@ -113,7 +81,7 @@ def get_page_properties(page_id):
         logger.error(f"⚠️ Неверный формат ID страницы: {page_id}")
         return None
 
-    logger.info(f"Webhook стартует... TOKEN = {NOTION_TOKEN[:7]}")
+    logger.debug("Webhook стартует... TOKEN = %.7s", NOTION_TOKEN)
 
     url = f"https://api.notion.com/v1/pages/{page_id}"
 
@@ -124,8 +92,9 @@ def get_page_properties(page_id):
     }
 
     try:
-        logger.info(f"🔍 Запрос свойств страницы: {page_id}")
-        response = requests.get(url, headers=headers)
+        logger.info("🔍 Запрос свойств страницы: %s", page_id)
+        with observe(NOTION_LATENCY, "pages.retrieve"):
+            response = requests.get(url, headers=headers)
 
         # Анализ ответа API
         if response.status_code == 401:
@@ -135,6 +104,7 @@ def get_page_properties(page_id):
             logger.error(f"❌ Ошибка 404: Страница не найдена. Убедитесь, что бот имеет доступ к странице {page_id}")
             return None
         elif response.status_code == 429:
+            RATE_LIMITED.labels("notion").inc()
             logger.error("❌ Ошибка 429: Слишком много запросов. Попробуйте позже")
             return None
 
@@ -150,70 +120,17 @@ def get_page_properties(page_id):
 
     except requests.exceptions.RequestException as e:
         logger.error(f"🚨 Ошибка при запросе к Notion API: {e}")
+        ERRORS.labels("notion").inc()
         return None
 
 
 def get_property_value(prop_data):
     """Извлекает значение свойства в читаемом формате"""
-    if not prop_data:
-        return ""
-
-    prop_type = prop_data.get('type')
-    if not prop_type:
-        return "[unknown type]"
-
     try:
-        # Обработка разных типов свойств
-        if prop_type == "title":
-            return "".join(t["plain_text"] for t in prop_data.get("title", []))
-
-        elif prop_type == "rich_text":
-            return "".join(t["plain_text"] for t in prop_data.get("rich_text", []))
-
-        elif prop_type == "number":
-            return str(prop_data.get("number", ""))
-
-        elif prop_type == "select":
-            select = prop_data.get("select")
-            return select["name"] if select else ""
-
-        elif prop_type == "multi_select":
-            options = prop_data.get("multi_select", [])
-            return ", ".join(opt["name"] for opt in options)
-
-        elif prop_type == "checkbox":
-            return "☑" if prop_data.get("checkbox") else "☐"
-
-        elif prop_type == "date":
-            date_obj = prop_data.get("date")
-            if not date_obj:
-                return ""
-            start = date_obj.get("start", "")
-            end = date_obj.get("end", "")
-            return f"{start} → {end}" if end else start
-
-        elif prop_type == "url":
-            return prop_data.get("url", "")
-
-        elif prop_type == "email":
-            return prop_data.get("email", "")
-
-        elif prop_type == "phone_number":
-            return prop_data.get("phone_number", "")
-
-        elif prop_type == "people":
-            people = prop_data.get("people", [])
-            return ", ".join(p.get("name", "unknown") for p in people)
-
-        elif prop_type == "files":
-            files = prop_data.get("files", [])
-            return ", ".join(f.get("name", "unnamed") for f in files)
-
-        else:
-            return f"[{prop_type}]"
-
+        # Общая таблица извлекателей по типу свойства, см. properties.py
+        return display_property_value(prop_data)
     except Exception as e:
-        logger.error(f"Ошибка обработки свойства {prop_type}: {e}")
+        logger.error(f"Ошибка обработки свойства {prop_data.get('type')}: {e}")
         return "[error]"
 
 
@@ -229,7 +146,7 @@ def process_notion_event(data):
     entity = data.get('entity', {})
     entity_type = entity.get('type')
 
-    logger.info(f"Обработка события: {event_type} (сущность: {entity_type})")
+    logger.info("Обработка события: %s (сущность: %s)", event_type, entity_type)
 
     if not event_type:
         logger.error("Тип события не указан")
@@ -276,23 +193,11 @@ def process_notion_event(data):
                 message += "\n*Измененные свойства:*\n"
                 found_updates = False
 
-                for encoded_prop_id in updated_properties:
-                    try:
-                        # Декодируем ID свойства
-                        prop_id = urllib.parse.unquote(encoded_prop_id)
-                    except Exception as e:
-                        logger.error(f"Ошибка декодирования {encoded_prop_id}: {e}")
-                        continue
-
-                    # Ищем свойство по ID
-                    prop_data = None
-                    prop_name = "unknown"
+                # Индекс id -> (имя, свойство) вместо перебора всех свойств на каждый id
+                by_id = index_properties(properties)
 
-                    for name, data in properties.items():
-                        if data.get('id') == prop_id:
-                            prop_data = data
-                            prop_name = name
-                            break
+                for prop_id in decode_property_ids(updated_properties):
+                    prop_name, prop_data = by_id.get(prop_id, ("unknown", None))
 
                     if not prop_data:
                         message += f"• `{prop_id}`: свойство не найдено\n"
@@ -319,6 +224,25 @@ def process_notion_event(data):
         return {"status": "skipped"}
 
 
+@routes.before_request
+def start_timer():
+    g.started = time.perf_counter()
+    # Поток waitress переиспользуется — id прошлого события не должен попасть в чужие логи
+    event_id.set(None)
+
+
+@routes.after_request
+def record_latency(response):
+    WEBHOOK_LATENCY.labels(request.method, response.status_code).observe(time.perf_counter() - g.started)
+    return response
+
+
+@routes.route('/metrics')
+def metrics_endpoint():
+    body, content_type = metrics.render()
+    return Response(body, content_type=content_type)
+
+
 @routes.route('/notion-webhook', methods=['GET', 'POST'])
 def webhook_endpoint():
     try:
@@ -332,14 +256,19 @@ def webhook_endpoint():
             logger.error("Invalid content type")
             return jsonify({"error": "Content-Type must be application/json"}), 400
 
-        try:
-            data = request.get_json()
+        # Подпись проверяется по сырым байтам до разбора JSON и запросов к Notion
+        body = request.get_data()
+        signed = NotionWebhookHandler.verify_signature(body, request.headers.get('X-Notion-Signature'))
+        if not signed and not is_handshake(body):
+            return jsonify({"error": "Invalid signature"}), 403
 
-            # После request.get_json()
-        except Exception as e:
-            logger.error(f"JSON parse error: {str(e)}")
-            raise
-        logger.debug(f"Request data: {json.dumps(data, indent=2)}")
+        try:
+            data = json.loads(body)
+        except ValueError as e:
+            logger.error("JSON parse error: %s", e)
+            return jsonify({"error": "Invalid JSON"}), 400
+        event_id.set(data.get('id'))
+        log_payload(logger, data)
 
         # Верификационный запрос
         if data.get('type') == 'webhook_verification':
@@ -348,16 +277,23 @@ def webhook_endpoint():
                 return jsonify({"challenge": data['challenge']}), 200
             return jsonify({"error": "Missing challenge"}), 400
 
-        # Проверка подписи
-        # if not NotionWebhookHandler.verify_signature(request):
-            # return jsonify({"error": "Invalid signature"}), 403
+        # Без подписи пропускается только рукопожатие выше
+        if not signed:
+            return jsonify({"error": "Invalid signature"}), 403
+
+        # Отсев по самому payload до запроса свойств страницы
+        if not events_filter.accept(data):
+            return jsonify({"status": "ignored"}), 200
 
         # Обработка события
         result = process_notion_event(data)
         return jsonify(result), 200
 
+    except RequestEntityTooLarge:
+        return jsonify({"error": "Payload too large"}), 413
     except Exception as e:
         logger.exception("Unhandled exception in webhook handler")
+        ERRORS.labels("webhook").inc()
         return jsonify({"error": "Internal server error"}), 500
 
 